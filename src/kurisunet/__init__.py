@@ -1,6 +1,11 @@
+import os
+
+from .constants import LOG_LEVEL_ENV
 from .register import get_module
 from .utils.logger import set_logger
 
-set_logger(level="INFO")
+# INFO: sinks of loguru belong to the application, they are only replaced on request
+if os.environ.get(LOG_LEVEL_ENV):
+    set_logger(level=os.environ[LOG_LEVEL_ENV].upper())  # type: ignore
 
 __all__ = ["get_module"]
@@ -0,0 +1,64 @@
+from typing import Any, Mapping, NoReturn
+
+
+def _read_only(self, *args: Any, **kwargs: Any) -> NoReturn:
+    msg = f"{type(self).__name__} is read-only, build a new container instead"
+    raise TypeError(msg)
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict, which can be shared without copying.
+    It is still a dict for isinstance checks, use merge to get a modified one.
+    """
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def merge(self, other: Mapping[Any, Any]) -> "FrozenDict":
+        """Return a new FrozenDict with items of other, values are shared, not copied."""
+        return FrozenDict({**self, **other})
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class FrozenList(list):
+    """Read-only list, which can be shared without copying."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = clear = _read_only
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+
+def freeze(obj: Any) -> Any:
+    """
+    Convert dicts and lists in the object to FrozenDict and FrozenList recursively.
+    Frozen containers are returned as is, other objects are shared, not copied.
+    """
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return FrozenList(freeze(i) for i in obj)
+    if type(obj) is tuple:  # INFO: namedtuples are kept as is
+        return tuple(freeze(i) for i in obj)
+    return obj
+
+
+def thaw(obj: Any) -> Any:
+    """
+    Copy dicts and lists in the object to plain dicts and lists recursively,
+    so the result can be modified without changing the object.
+    Other objects are shared, not copied.
+    """
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [thaw(i) for i in obj]
+    if type(obj) is tuple:
+        return tuple(thaw(i) for i in obj)
+    return obj
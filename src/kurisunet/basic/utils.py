@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Any, Iterable, TypeVar
+from typing import Any, Hashable, Iterable, Mapping, TypeVar
 
 from .types import Env, ListTuple, OneOrMore
 
@@ -41,7 +41,7 @@ def get_except_keys(dic: dict[Any, T], keys: ListTuple[Any]) -> dict[Any, T]:
     return {k: v for k, v in dic.items() if k not in keys}
 
 
-def merge_envs(envs: ListTuple[Env]) -> Env:
+def merge_envs(envs: ListTuple[Mapping[str, Any]]) -> Env:
     """Merge multiple environments into one, overwriting keys in order."""
     merged_env = {}
     for env in envs:
@@ -57,6 +57,21 @@ def is_env_conflict(env1: Env, env2: Env) -> bool:
     return False
 
 
+def to_hashable(obj: Any) -> Hashable:
+    """
+    Convert an object to a hashable key with its type, containers are converted recursively.
+    Raise TypeError if the object is not hashable.
+    """
+    if isinstance(obj, (list, tuple)):
+        return (type(obj), tuple(to_hashable(i) for i in obj))
+    if isinstance(obj, dict):
+        return (type(obj), tuple((k, to_hashable(v)) for k, v in obj.items()))
+    if isinstance(obj, (set, frozenset)):
+        return (type(obj), frozenset(to_hashable(i) for i in obj))
+    hash(obj)
+    return (type(obj), obj)
+
+
 def to_path(path: str | Path) -> Path:
     """Convert a string or Path to a Path object."""
     return path if isinstance(path, Path) else Path(path)
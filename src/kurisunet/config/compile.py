@@ -0,0 +1,103 @@
+from types import CodeType
+from typing import Any, Literal
+
+from ..constants import *
+from .utils import compile_string
+
+Codes = dict[tuple[str, str], CodeType]
+
+
+class CompiledConfig(dict):
+    """
+    Config whose expressions are already compiled and validated,
+    for example restored from the config cache, so compile_config skips it.
+    """
+
+
+def _compile(
+    value: Any, path: str, codes: Codes, mode: Literal["eval", "exec"] = "eval"
+) -> None:
+    if not isinstance(value, str) or value.startswith(STR_PREFIX) or not value:
+        return
+    try:
+        codes[(value, mode)] = compile_string(value, mode)
+    except SyntaxError as e:
+        raise ValueError(f"Invalid syntax of {value!r} at {path}: {e.msg}") from e
+
+
+def _compile_list(
+    values: Any, path: str, codes: Codes, mode: Literal["eval", "exec"] = "eval"
+) -> None:
+    if not isinstance(values, (list, tuple)):
+        return
+    for i, value in enumerate(values):
+        _compile(value, f"{path}.{i}", codes, mode)
+
+
+def _compile_dict(values: Any, path: str, codes: Codes) -> None:
+    if not isinstance(values, dict):
+        return
+    for key, value in values.items():
+        _compile(value, f"{path}.{key}", codes)
+
+
+def _compile_vars(vars: Any, path: str, codes: Codes) -> None:
+    if not isinstance(vars, (list, tuple)):
+        return
+    for i, var in enumerate(vars):
+        if isinstance(var, dict):
+            _compile_dict(var, f"{path}.{i}", codes)
+        elif isinstance(var, tuple) and len(var) == 2:
+            _compile(var[1], f"{path}.{i}.{var[0]}", codes)
+
+
+def _compile_layers(layers: Any, path: str, codes: Codes) -> None:
+    if not isinstance(layers, (list, tuple)):
+        return
+    for i, layer in enumerate(layers):
+        if isinstance(layer, str):
+            _compile(layer, f"{path}.{i}", codes)
+            continue
+        if not isinstance(layer, (list, tuple)):
+            continue
+        for j, item in enumerate(layer):
+            if isinstance(item, (list, tuple)) and j > 0:
+                _compile_list(item, f"{path}.{i}.{j}", codes)
+            elif isinstance(item, dict) and j > 0:
+                _compile_dict(item, f"{path}.{i}.{j}", codes)
+            else:
+                _compile(item, f"{path}.{i}.{j}", codes)
+
+
+def _compile_module(config: dict[str, Any], path: str, codes: Codes) -> None:
+    _compile_list(config.get(IMPORTS_KEY), f"{path}.{IMPORTS_KEY}", codes, "exec")
+    _compile_layers(config.get(CONVERTERS_KEY), f"{path}.{CONVERTERS_KEY}", codes)
+    if CONVERTERS_KEY in config:
+        return  # INFO: other keys may be rewritten by converters
+    _compile_vars(config.get(ARGS_KEY), f"{path}.{ARGS_KEY}", codes)
+    _compile(config.get(PRE_EXEC_KEY), f"{path}.{PRE_EXEC_KEY}", codes, "exec")
+    _compile_vars(config.get(BUFFERS_KEY), f"{path}.{BUFFERS_KEY}", codes)
+    _compile_vars(config.get(PARAMS_KEY), f"{path}.{PARAMS_KEY}", codes)
+    _compile_vars(config.get(VARS_KEY), f"{path}.{VARS_KEY}", codes)
+    _compile_layers(config.get(LAYERS_KEY), f"{path}.{LAYERS_KEY}", codes)
+    _compile(config.get(POST_EXEC_KEY), f"{path}.{POST_EXEC_KEY}", codes, "exec")
+
+
+def compile_config(config: dict[str, Any]) -> Codes:
+    """
+    Compile all expressions and exec statements in the config to cached code objects.
+    Raise ValueError with the key path if any of them has invalid syntax.
+    Return the code objects keyed by (string, mode) of compile_string,
+    which is empty for CompiledConfig.
+    """
+    codes: Codes = {}
+    if isinstance(config, CompiledConfig):
+        return codes
+    excepts = [AUTO_REGISTER_KEY, GLOBAL_IMPORTS_KEY, GLOBAL_EXEC_KEY, GLOBAL_VARS_KEY]
+    _compile_list(config.get(GLOBAL_IMPORTS_KEY), GLOBAL_IMPORTS_KEY, codes, "exec")
+    _compile(config.get(GLOBAL_EXEC_KEY), GLOBAL_EXEC_KEY, codes, "exec")
+    _compile_vars(config.get(GLOBAL_VARS_KEY), GLOBAL_VARS_KEY, codes)
+    for name, module in config.items():
+        if name not in excepts and isinstance(module, dict):
+            _compile_module(module, name, codes)
+    return codes
@@ -0,0 +1,333 @@
+from functools import cached_property
+import hashlib
+import hmac
+from importlib.util import MAGIC_NUMBER
+import marshal
+import os
+from pathlib import Path
+import re
+import secrets
+from typing import Any, TypedDict
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # INFO: pyyaml is built without libyaml
+    from yaml import SafeLoader
+
+from ..basic.types import ListTuple
+from ..basic.utils import to_path
+from ..constants import *
+from ..utils.logger import get_logger
+from .compile import Codes, CompiledConfig, compile_config
+from .module.imports import add_checked_imports, check_imports
+from .utils import add_precompiled
+
+logger = get_logger("Register")
+
+CACHE_VERSION = 3
+CACHE_KEY_FILE = "cache.key"
+CACHE_KEY_SIZE = 32
+GLOBAL_KEYS = (AUTO_REGISTER_KEY, GLOBAL_IMPORTS_KEY, GLOBAL_EXEC_KEY, GLOBAL_VARS_KEY)
+DOCUMENT_START = re.compile(r"---[ \t]*(#.*)?")
+TOP_LEVEL_KEY = re.compile(r"([A-Za-z_][\w.-]*)[ \t]*:(?:[ \t]+(.*))?")
+MAPPING_KEY = re.compile(r"[A-Za-z_][\w.-]*[ \t]*:(?:[ \t].*)?")
+# INFO: anchors, aliases and tags may link sections, so such documents are loaded whole
+NODE_PROPERTY = re.compile(r"(?:^|[\s\[{,])(?:[&*]|!(?!=))[^\s,\[\]{}]")
+
+CacheEntry = TypedDict(
+    "CacheEntry",
+    {
+        "mtime_ns": int,
+        "size": int,
+        "digest": str,
+        "config": Any,
+        "codes": Codes,
+        "imports": list[tuple[str, ...]],
+    },
+)
+
+_cache_dir: Path | None = (
+    Path(os.environ[CONFIG_CACHE_ENV]) if os.environ.get(CONFIG_CACHE_ENV) else None
+)
+
+
+def set_config_cache(dir: Path | str | None) -> None:
+    """
+    Set the directory to cache parsed configs and their compiled expressions,
+    None disables the cache. The default is taken from KURISUNET_CONFIG_CACHE.
+    """
+    global _cache_dir
+    _cache_dir = None if dir is None else to_path(dir)
+
+
+def get_config_cache() -> Path | None:
+    """Get the directory of the config cache, None if it is disabled."""
+    return _cache_dir
+
+
+def _get_cache_path(cache_dir: Path, path: Path) -> Path:
+    # INFO: code objects from marshal are only valid for the same python version
+    key = f"{path.resolve()}|{CACHE_VERSION}|{MAGIC_NUMBER.hex()}|{yaml.__version__}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return cache_dir / f"{path.stem}-{digest}.cache"
+
+
+def _check_private(path: Path, stat: os.stat_result) -> None:
+    if not hasattr(os, "getuid"):  # INFO: no owner and mode bits on windows
+        return
+    if stat.st_uid != os.getuid():
+        raise ValueError(f"{path} is not owned by the current user")
+    if stat.st_mode & 0o077:
+        raise ValueError(f"{path} is accessible by other users")
+
+
+def _get_cache_key(cache_dir: Path) -> bytes | None:
+    # INFO: cached code objects are executed, so entries are signed with a private key
+    # and files written without it, for example by other users, are never loaded.
+    key_path = cache_dir / CACHE_KEY_FILE
+    try:
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        _check_private(cache_dir, cache_dir.stat())
+        if not key_path.exists():
+            # INFO: the key is complete once it is visible, even if the writer crashes
+            temp_path = cache_dir / f"{CACHE_KEY_FILE}.{os.getpid()}.tmp"
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as file:
+                file.write(secrets.token_bytes(CACHE_KEY_SIZE))
+            os.replace(temp_path, key_path)
+        with open(key_path, "rb") as file:
+            _check_private(key_path, os.fstat(file.fileno()))
+            key = file.read()
+        if len(key) != CACHE_KEY_SIZE:
+            raise ValueError(f"{key_path} has {len(key)} bytes, not {CACHE_KEY_SIZE}")
+    except (OSError, ValueError) as e:
+        logger.warning(f"Config cache {cache_dir} is disabled: {e}")
+        return None
+    return key
+
+
+def _sign(key: bytes, data: bytes) -> bytes:
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+
+def _read_entry(cache_path: Path, key: bytes) -> CacheEntry | None:
+    if not cache_path.is_file():
+        return None
+    try:
+        content = cache_path.read_bytes()
+        signature, data = content[:32], content[32:]
+        if not hmac.compare_digest(signature, _sign(key, data)):
+            raise ValueError("signature mismatch")
+        return marshal.loads(data)
+    except Exception as e:
+        logger.warning(f"Invalid config cache {cache_path}, ignoring it: {e}")
+        return None
+
+
+def _write_entry(cache_path: Path, entry: CacheEntry, key: bytes) -> None:
+    # INFO: write to a temporary file first, so other processes never read a partial file
+    try:
+        data = marshal.dumps(entry)  # INFO: data and code objects only, no pickle
+        content = _sign(key, data) + data
+        temp_path = cache_path.parent / f"{cache_path.name}.{os.getpid()}.tmp"
+        temp_path.write_bytes(content)
+        os.replace(temp_path, cache_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to write config cache {cache_path}: {e}")
+
+
+def _get_imports_list(config: dict[str, Any]) -> list[ListTuple[str]]:
+    global_imports = config.get(GLOBAL_IMPORTS_KEY, [])
+    imports_list = []
+    if isinstance(global_imports, list):
+        imports_list.append(global_imports + BUILD_IN_IMPORT)
+    for module in config.values():
+        if isinstance(module, dict) and IMPORTS_KEY in module:
+            imports_list.append(module[IMPORTS_KEY])
+    return imports_list
+
+
+def _build_entry(
+    configs: list[Any], stat: os.stat_result, digest: str
+) -> CacheEntry | None:
+    if not configs or not all(isinstance(c, dict) for c in configs):
+        return None
+    try:
+        codes = {k: v for c in configs for k, v in compile_config(c).items()}
+    except ValueError:
+        return None  # INFO: invalid configs are not cached, register_config reports them
+    checked = []
+    for imports in (i for c in configs for i in _get_imports_list(c)):
+        try:
+            check_imports(imports)
+        except (ValueError, TypeError):
+            continue  # INFO: reported when the imports are used
+        checked.append(tuple(imports))
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "digest": digest,
+        "config": configs,
+        "codes": codes,
+        "imports": checked,
+    }
+
+
+def _restore_entry(entry: CacheEntry) -> Any:
+    add_precompiled(entry["codes"])
+    add_checked_imports(entry["imports"])
+    # INFO: cached configs are compiled and validated, so they are not walked again
+    return [CompiledConfig(c) for c in entry["config"]]
+
+
+def _load_yaml(content: bytes | str) -> list[Any]:
+    documents = yaml.load_all(content, Loader=SafeLoader)
+    return [d for d in documents if d is not None]
+
+
+class _LazyDocument:
+    def __init__(self, text: str):
+        self.text = text
+
+    @cached_property
+    def config(self) -> Any:
+        return yaml.load(self.text, Loader=SafeLoader)
+
+
+class ConfigSection:
+    """
+    Text of a top-level section in a yaml document, which is parsed on first access of config.
+    If it can not be parsed alone, for example it uses an anchor of another section,
+    the whole document is parsed instead.
+    """
+
+    def __init__(self, name: str, text: str, document: _LazyDocument):
+        self.name = name
+        self.text = text
+        self.document = document
+
+    @cached_property
+    def config(self) -> Any:
+        try:
+            loaded = yaml.load(self.text, Loader=SafeLoader)
+        except yaml.YAMLError:
+            loaded = None
+        if isinstance(loaded, dict) and list(loaded) == [self.name]:
+            return loaded[self.name]
+        logger.debug(f"Section {self.name} is loaded with the whole document")
+        return self.document.config[self.name]
+
+    def __repr__(self) -> str:
+        return f"ConfigSection({self.name!r})"
+
+
+def _split_documents(text: str) -> list[str] | None:
+    documents: list[list[str]] = [[]]
+    for line in text.splitlines(keepends=True):
+        if line.startswith(("%", "...")):
+            return None  # INFO: directives and document ends are left to yaml
+        if not line.startswith("---"):
+            documents[-1].append(line)
+        elif DOCUMENT_START.fullmatch(line.rstrip("\r\n")):
+            documents.append([])
+        else:
+            return None
+    return ["".join(lines) for lines in documents]
+
+
+def _is_block_mapping(lines: list[str]) -> bool:
+    for line in lines[1:]:
+        content = line.strip()
+        if content and not content.startswith("#"):
+            return line[0] in " \t" and MAPPING_KEY.fullmatch(content) is not None
+    return False
+
+
+def _split_document(text: str) -> dict[str, Any] | None:
+    if NODE_PROPERTY.search(text):
+        return None
+    document = _LazyDocument(text)
+    sections: dict[str, list[str]] = {}
+    lazy: dict[str, bool] = {}
+    current: list[str] | None = None
+    for line in text.splitlines(keepends=True):
+        if not line.strip() or line[0] in " \t#":
+            pass
+        elif match := TOP_LEVEL_KEY.fullmatch(line.rstrip("\r\n")):
+            name, value = match.groups()
+            if name in sections:
+                return None
+            current = sections[name] = []
+            # INFO: inline values and global keys are small and always used
+            inline = value is not None and not value.startswith("#")
+            lazy[name] = not inline and name not in GLOBAL_KEYS
+        elif not line.startswith("- ") or current is None:
+            return None  # INFO: not a block mapping with simple keys
+        if current is not None:
+            current.append(line)
+    if not sections:
+        return None
+    config = {}
+    for name, lines in sections.items():
+        section = ConfigSection(name, "".join(lines), document)
+        # INFO: only module sections are lazy, others are checked when registered
+        lazy_section = lazy[name] and _is_block_mapping(lines)
+        config[name] = section if lazy_section else section.config
+    return config
+
+
+def _load_lazy_yaml(text: str) -> list[Any]:
+    if (documents := _split_documents(text)) is None:
+        return _load_yaml(text)
+    configs = []
+    for document in documents:
+        if (config := _split_document(document)) is None:
+            configs.extend(_load_yaml(document))
+        else:
+            configs.append(config)
+    return configs
+
+
+def load_configs(path: Path | str, lazy: bool = True) -> list[Any]:
+    """
+    Load all documents of a yaml config file, empty documents are skipped.
+    If the config cache is enabled, the parsed documents, their compiled expressions and
+    checked imports are cached on disk, so warm starts skip parsing and validating.
+    The cache is checked with the file mtime and size first, then the content hash.
+    Cache files are signed with a private key in the cache directory, others are ignored.
+    If the key or the directory is not private to the current user, the cache is disabled.
+    Otherwise if lazy is True, module sections of block mapping documents are ConfigSection,
+    which are only parsed when their config is first accessed.
+    """
+    global _cache_dir
+    path = to_path(path)
+    key = None if _cache_dir is None else _get_cache_key(_cache_dir)
+    if key is None:
+        _cache_dir = None  # INFO: _get_cache_key warns if the cache is not private
+    if _cache_dir is None and lazy:
+        return _load_lazy_yaml(path.read_text(encoding="utf-8"))
+    if _cache_dir is None or key is None:
+        return _load_yaml(path.read_bytes())
+
+    stat = path.stat()
+    cache_path = _get_cache_path(_cache_dir, path)
+    entry = _read_entry(cache_path, key)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+    if entry is not None and (entry["mtime_ns"], entry["size"]) == stat_key:
+        logger.debug(f"Config {path} is loaded from cache")
+        return _restore_entry(entry)
+
+    content = path.read_bytes()
+    digest = hashlib.sha256(content).hexdigest()
+    if entry is not None and entry["digest"] == digest:
+        logger.debug(f"Config {path} is touched but not changed, loaded from cache")
+        entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        _write_entry(cache_path, entry, key)
+        return _restore_entry(entry)
+
+    configs = _load_yaml(content)
+    if (entry := _build_entry(configs, stat, digest)) is not None:
+        _write_entry(cache_path, entry, key)
+    return configs
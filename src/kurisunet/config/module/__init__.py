@@ -1,17 +1,20 @@
-from .args import get_input_env
+from .args import bind_input, get_input_env, get_param_names
 from .converters import parse_converters
 from .exec import exec_with_env, get_exec_env
 from .imports import get_imports_env
 from .layers import is_drop_key, parse_layers
-from .vars import get_vars_env
+from .vars import get_var_items, get_vars_env
 
 __all__ = [
+    "bind_input",
     "get_input_env",
+    "get_param_names",
     "parse_converters",
     "exec_with_env",
     "get_exec_env",
     "get_imports_env",
     "is_drop_key",
     "parse_layers",
+    "get_var_items",
     "get_vars_env",
 ]
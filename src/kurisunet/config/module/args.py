@@ -82,6 +82,22 @@ def _get_arg_dict_env(arg_dict: ArgDict, env: Env) -> Env:
     }
 
 
+def bind_input(params: Any, args: Args, kwargs: Kwargs | None = None) -> ArgDict:
+    """
+    Bind the args and kwargs to the param names without evaluating defaults,
+    so calls with the same inputs in different forms get the same dict.
+    """
+    _check_params(params)
+    formatted_params = _format_params(params)
+    return _get_input_arg_dict(formatted_params, args, kwargs or {})
+
+
+def get_param_names(params: Any) -> tuple[str, ...]:
+    """Get the names of the params in order."""
+    _check_params(params)
+    return tuple(p if isinstance(p, str) else p[0] for p in _format_params(params))
+
+
 def get_input_env(
     params: Any, args: Args, kwargs: Kwargs | None = None, env: Env | None = None
 ) -> Env:
@@ -1,6 +1,7 @@
 from typing import Any
 
 from ...basic.types import Env
+from ..utils import compile_string
 
 
 def _check_exec(exec_: Any) -> None:
@@ -8,27 +9,35 @@ def _check_exec(exec_: Any) -> None:
         raise ValueError(f"Invalid {exec_}, should be str")
 
 
-def _get_exec_env(exec_: str, env: Env) -> Env:
+def _get_exec_env(exec_: str, env: Env, inplace: bool = False) -> Env:
     if not exec_:
         return {}
     local_env = {}
-    exec(exec_, env.copy(), local_env)
+    exec(compile_string(exec_, "exec"), env if inplace else env.copy(), local_env)
     return local_env
 
 
-def _exec_with_env(exec_: str, env: Env) -> None:
+def _exec_with_env(exec_: str, env: Env, inplace: bool = False) -> None:
     if not exec_:
         return
-    exec(exec_, env.copy(), {})
+    exec(compile_string(exec_, "exec"), env if inplace else env.copy(), {})
 
 
-def exec_with_env(exec_: str, env: Env | None = None) -> None:
-    """Execute the given exec statement with the provided environment."""
+def exec_with_env(exec_: str, env: Env | None = None, inplace: bool = False) -> None:
+    """
+    Execute the given exec statement with the provided environment.
+    If inplace is True, env is used as globals without copy,
+    so it should be owned by the caller.
+    """
     _check_exec(exec_)
-    _exec_with_env(exec_, env or {})
+    _exec_with_env(exec_, {} if env is None else env, inplace)
 
 
-def get_exec_env(exec_: str, env: Env | None = None) -> Env:
-    """Execute the given exec statement and return the environment."""
+def get_exec_env(exec_: str, env: Env | None = None, inplace: bool = False) -> Env:
+    """
+    Execute the given exec statement and return the environment.
+    If inplace is True, env is used as globals without copy,
+    so it should be owned by the caller.
+    """
     _check_exec(exec_)
-    return _get_exec_env(exec_, env or {})
+    return _get_exec_env(exec_, {} if env is None else env, inplace)
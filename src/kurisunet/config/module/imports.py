@@ -1,14 +1,21 @@
 import ast
 from ast import Import, ImportFrom
-from typing import Any, cast
+from typing import Any, Iterable, cast
 
 from ...basic.types import Env, ListTuple
 from ...basic.utils import is_list_tuple_of
+from ..utils import compile_string
 
 ImportType = Import | ImportFrom
 
+# INFO: import lists already validated, they are only checked once per process
+_checked_imports: set[tuple[str, ...]] = set()
+
 
 def _check_imports(imports: Any) -> None:
+    if is_list_tuple_of(imports, str) and tuple(imports) in _checked_imports:
+        return
+
     def check_import(import_: str):
         try:
             body = ast.parse(import_).body
@@ -27,15 +34,26 @@ def _check_imports(imports: Any) -> None:
     unique_names = set(names)
     if len(unique_names) != len(names):
         raise ValueError(f"Duplicate import names found in {imports}")
+    _checked_imports.add(tuple(imports))
 
 
 def _get_imports_env(imports: ListTuple[str]) -> Env:
     modules = {}
     for import_ in imports:
-        exec(import_, {}, modules)
+        exec(compile_string(import_, "exec"), {}, modules)
     return modules
 
 
+def check_imports(imports: Any) -> None:
+    """Check the import statements, raise ValueError if they are invalid."""
+    _check_imports(imports)
+
+
+def add_checked_imports(imports_list: Iterable[ListTuple[str]]) -> None:
+    """Mark the import lists as checked, for example by a cache of an earlier process."""
+    _checked_imports.update(tuple(imports) for imports in imports_list)
+
+
 def get_imports_env(imports: Any) -> Env:
     """Get the imports environment from the given import statements."""
     _check_imports(imports)
@@ -1,15 +1,21 @@
 from ....basic.types import Env
 from ...types import Args, Kwargs, LayerArgs, LayerKwargs
-from ...utils import eval_string
+from ...utils import ConstantFolder, eval_string
 
-__eval = lambda x, env: eval_string(x, env) if isinstance(x, str) else x
+__eval = lambda x, env, consts: (
+    eval_string(x, env, consts) if isinstance(x, str) else x
+)
 
 
-def parse_args(args: LayerArgs, env: Env | None) -> Args:
+def parse_args(
+    args: LayerArgs, env: Env | None, consts: ConstantFolder | None = None
+) -> Args:
     """Parse the expressions in args"""
-    return tuple(__eval(x, env or {}) for x in args)
+    return tuple(__eval(x, env or {}, consts) for x in args)
 
 
-def parse_kwargs(kwargs: LayerKwargs, env: Env | None) -> Kwargs:
+def parse_kwargs(
+    kwargs: LayerKwargs, env: Env | None, consts: ConstantFolder | None = None
+) -> Kwargs:
     """Parse the expressions in kwargs"""
-    return {k: __eval(v, env or {}) for k, v in kwargs.items()}
+    return {k: __eval(v, env or {}, consts) for k, v in kwargs.items()}
@@ -3,7 +3,7 @@ from typing import Any
 from ....basic.types import Env
 from ....constants import ALL_FROM, DROP_FROM
 from ...types import FormattedFrom, FormattedLayerFrom, From, LayerFrom, ParsedLayerFrom
-from ...utils import eval_string
+from ...utils import ConstantFolder, eval_string
 
 
 def __check_layer_from(layer_from: Any) -> None:
@@ -37,10 +37,12 @@ def __check_layer_from(layer_from: Any) -> None:
         check_from(from_)
 
 
-def __parse_layer_from(from_: LayerFrom, env: Env) -> ParsedLayerFrom:
+def __parse_layer_from(
+    from_: LayerFrom, env: Env, consts: ConstantFolder | None
+) -> ParsedLayerFrom:
     if not isinstance(from_, str) or from_ == DROP_FROM:
         return from_
-    parsed = eval_string(from_, env)
+    parsed = eval_string(from_, env, consts)
     if isinstance(parsed, str) and not parsed == DROP_FROM:
         raise ValueError(f"Invalid drop key {parsed}")
     __check_layer_from(parsed)
@@ -61,10 +63,12 @@ def __format_layer_from(layer_from: ParsedLayerFrom) -> FormattedLayerFrom:
     return (format_from(layer_from),)
 
 
-def parse_layer_from(from_: Any, env: Env | None) -> FormattedLayerFrom:
+def parse_layer_from(
+    from_: Any, env: Env | None, consts: ConstantFolder | None = None
+) -> FormattedLayerFrom:
     """Parse the expressions and format the layer from."""
     __check_layer_from(from_)
-    parsed = __parse_layer_from(from_, env or {})
+    parsed = __parse_layer_from(from_, env or {}, consts)
     return __format_layer_from(parsed)
 
 
@@ -3,7 +3,7 @@ from typing import Any
 from ....basic.types import Env, ListTuple
 from ....basic.utils import is_list_tuple_of
 from ...types import FinalLayer, FormattedLayer, Layer
-from ...utils import eval_string
+from ...utils import ConstantFolder, eval_string
 from .args import parse_args, parse_kwargs
 from .layer_from import parse_layer_from
 from .module import parse_module
@@ -29,11 +29,13 @@ def __check_layers(layers: Any) -> None:
         check_layer(layer)
 
 
-def __parse_layers(layers: ListTuple[Layer], env: Env) -> ListTuple:
+def __parse_layers(
+    layers: ListTuple[Layer], env: Env, consts: ConstantFolder | None
+) -> ListTuple:
     def parse_layer(layer: Layer, env: Env) -> ListTuple:
         if not isinstance(layer, str):
             return (layer,)
-        parsed = eval_string(layer, env)
+        parsed = eval_string(layer, env, consts)
         if not is_list_tuple_of(parsed, (list, tuple)):
             parsed = (parsed,)
         __check_layers(parsed)
@@ -62,19 +64,24 @@ def __format_layers(layers: ListTuple) -> tuple[FormattedLayer, ...]:
     return tuple(format_layer(layer) for layer in layers)
 
 
-def parse_layers(layers: Any, env: Env | None = None) -> tuple[FinalLayer, ...]:
-    """Parse the expressions between and inside the layers."""
+def parse_layers(
+    layers: Any, env: Env | None = None, consts: ConstantFolder | None = None
+) -> tuple[FinalLayer, ...]:
+    """
+    Parse the expressions between and inside the layers.
+    If consts is given, its constant expressions are evaluated once and reused.
+    """
 
     def parse_layer(layer: FormattedLayer) -> FinalLayer:
         f, m, a, k = layer
         return {
-            "from": parse_layer_from(f, env),
-            "module": parse_module(m, env),
-            "args": parse_args(a, env),
-            "kwargs": parse_kwargs(k, env),
+            "from": parse_layer_from(f, env, consts),
+            "module": parse_module(m, env, consts),
+            "args": parse_args(a, env, consts),
+            "kwargs": parse_kwargs(k, env, consts),
         }
 
     __check_layers(layers)
-    layers = __parse_layers(layers, env or {})
+    layers = __parse_layers(layers, env or {}, consts)
     layers = __format_layers(layers)
     return tuple(parse_layer(layer) for layer in layers)
@@ -5,7 +5,7 @@ import torch.nn as nn
 
 from ....basic.types import Env
 from ...types import CustomModule, LayerModule, Module
-from ...utils import eval_string
+from ...utils import ConstantFolder, eval_string
 
 
 def __check_module(module: Any) -> None:
@@ -14,9 +14,11 @@ def __check_module(module: Any) -> None:
         raise ValueError(msg)
 
 
-def __parse_module(module: LayerModule, env: Env) -> Module:
+def __parse_module(
+    module: LayerModule, env: Env, consts: ConstantFolder | None
+) -> Module:
     if isinstance(module, str):
-        module = eval_string(module, env)
+        module = eval_string(module, env, consts)
     if isinstance(module, (type, CustomModule)):
         return module
     if isinstance(module, FunctionType):
@@ -27,7 +29,9 @@ def __parse_module(module: LayerModule, env: Env) -> Module:
     raise ValueError(msg)
 
 
-def parse_module(module: LayerModule, env: Env | None) -> Module:
+def parse_module(
+    module: LayerModule, env: Env | None, consts: ConstantFolder | None = None
+) -> Module:
     """Parse the expressions in the module."""
     __check_module(module)
-    return __parse_module(module, env or {})
+    return __parse_module(module, env or {}, consts)
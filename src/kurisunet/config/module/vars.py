@@ -1,10 +1,10 @@
 from copy import copy
-from typing import Any
+from typing import Any, Iterable
 
 from ...basic.types import Env, ListTuple
 from ...basic.utils import is_list_tuple_of
 from ..types import FormattedVar, Var
-from ..utils import eval_string
+from ..utils import DYNAMIC_NAMES, ConstantFolder, eval_string, get_names
 
 
 def _check_vars(vars: Any) -> None:
@@ -32,17 +32,63 @@ def _format_vars(vars: ListTuple[Var]) -> tuple[FormattedVar, ...]:
     return tuple(format_var(var) for var in vars)
 
 
-def _get_vars_env(vars: ListTuple[FormattedVar], env: Env) -> Env:
-    used_env = copy(env)
+def _get_needed_vars(vars: ListTuple[FormattedVar], used: set[str]) -> set[int]:
+    # INFO: a var can only read vars before it, so one reversed pass finds all of them
+    needed_names = set(used)
+    needed = set()
+    for i in reversed(range(len(vars))):
+        key, value = vars[i]
+        if key not in needed_names:
+            continue
+        needed.add(i)
+        if isinstance(value, str):
+            needed_names.update(get_names(value))
+    if needed_names & DYNAMIC_NAMES:
+        return set(range(len(vars)))
+    return needed
+
+
+def _get_vars_env(
+    vars: ListTuple[FormattedVar],
+    env: Env,
+    needed: set[int] | None = None,
+    consts: ConstantFolder | None = None,
+    inplace: bool = False,
+) -> Env:
+    used_env = env if inplace else copy(env)
     new_env = {}
-    for key, value in vars:
-        value = eval_string(value, used_env) if isinstance(value, str) else value
+    for i, (key, value) in enumerate(vars):
+        if needed is not None and i not in needed:
+            continue
+        if isinstance(value, str):
+            value = eval_string(value, used_env, consts)
         used_env[key] = new_env[key] = value
     return new_env
 
 
-def get_vars_env(vars: Any, env: Env | None = None) -> Env:
-    """Get the variable environment from the vars."""
+def get_var_items(vars: Any) -> tuple[FormattedVar, ...]:
+    """Get the keys and values of the vars in order without evaluating them."""
+    _check_vars(vars)
+    return _format_vars(vars)
+
+
+def get_vars_env(
+    vars: Any,
+    env: Env | None = None,
+    used: Iterable[str] | None = None,
+    consts: ConstantFolder | None = None,
+    inplace: bool = False,
+) -> Env:
+    """
+    Get the variable environment from the vars.
+    If used is given, only vars read by these names (directly or through other vars) are evaluated,
+    use config.utils.get_names to get the names of expressions.
+    If consts is given, its constant expressions are evaluated once and reused.
+    If inplace is True, vars are also written into env instead of a copy of it,
+    so env should be owned by the caller.
+    """
     _check_vars(vars)
     formatted_vars = _format_vars(vars)
-    return _get_vars_env(formatted_vars, env or {})
+    needed = None if used is None else _get_needed_vars(formatted_vars, set(used))
+    env = {} if env is None else env
+    return _get_vars_env(formatted_vars, env, needed, consts, inplace)
@@ -1,11 +1,160 @@
-from typing import Any
+import dis
+from functools import lru_cache
+from types import CodeType
+from typing import Any, Callable, Iterable, Iterator, Literal, Mapping
 
 from ..basic.types import Env
 from ..constants import STR_PREFIX
 
 
-def eval_string(string: str, env: Env) -> Any:
-    """Evaluate a string in the given environment."""
+_precompiled: dict[tuple[str, str], CodeType] = {}
+
+
+def add_precompiled(codes: Mapping[tuple[str, str], CodeType]) -> None:
+    """Add code objects keyed by (string, mode), compile_string returns them without compiling."""
+    _precompiled.update(codes)
+
+
+@lru_cache(maxsize=None)
+def compile_string(string: str, mode: Literal["eval", "exec"] = "eval") -> CodeType:
+    """Compile a string to a code object, the result is cached by the string."""
+    if (code := _precompiled.get((string, mode))) is not None:
+        return code
+    if mode == "eval":
+        string = string.lstrip(" \t")  # INFO: same as eval with a string
+    return compile(string, "<string>", mode)
+
+
+def eval_string(string: str, env: Env, consts: "ConstantFolder | None" = None) -> Any:
+    """Evaluate a string in the given environment, folded constants are reused."""
     if string.startswith(STR_PREFIX):
         return string[len(STR_PREFIX) :]
-    return eval(string, env)
+    if consts is not None:
+        return consts.eval(string, env)
+    return eval(compile_string(string), env)
+
+
+# INFO: names which let an expression read the environment without naming the keys
+DYNAMIC_NAMES = frozenset({"eval", "exec", "locals", "globals", "vars", "__dict__"})
+
+
+def get_code_names(code: CodeType) -> set[str]:
+    """Get the global and attribute names a code object and its nested code may read."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names.update(get_code_names(const))
+        elif isinstance(const, str) and const.isidentifier():
+            names.add(const)
+        elif isinstance(const, str):
+            names.update(get_names(const))  # INFO: strings may be evaluated later
+    return names
+
+
+@lru_cache(maxsize=None)
+def get_names(string: str, mode: Literal["eval", "exec"] = "eval") -> frozenset[str]:
+    """
+    Get the names a string may read when it is evaluated or executed, from its code object.
+    Names in nested functions and string constants, which may be evaluated later, are included.
+    The result is a superset, for example attribute names are included too.
+    """
+    if mode == "eval" and string.startswith(STR_PREFIX):
+        string = string[len(STR_PREFIX) :]
+    try:
+        return frozenset(get_code_names(compile_string(string, mode)))
+    except (SyntaxError, ValueError):
+        return frozenset()  # INFO: invalid strings are reported when they are evaluated
+
+
+def iter_config_strings(config: Any) -> Iterator[str]:
+    """Iterate the strings in nested lists, tuples and dict values."""
+    if isinstance(config, str):
+        yield config
+    elif isinstance(config, (list, tuple)):
+        for i in config:
+            yield from iter_config_strings(i)
+    elif isinstance(config, dict):
+        for v in config.values():
+            yield from iter_config_strings(v)
+
+
+def get_config_names(config: Any) -> frozenset[str]:
+    """Get the names the strings in nested lists, tuples and dict values may read."""
+    return frozenset().union(*(get_names(s) for s in iter_config_strings(config)))
+
+
+# INFO: opcodes which call code or build mutable containers, results may be fresh.
+# Operators call code too, for example list + list and arr[1:] build new objects.
+FRESH_OPS = (
+    "CALL",
+    "PRECALL",
+    "BINARY_",
+    "INPLACE_",
+    "UNARY_",
+    "COMPARE_OP",
+    "BUILD_LIST",
+    "BUILD_SET",
+    "BUILD_MAP",
+    "BUILD_CONST_KEY_MAP",
+    "LIST_",
+    "SET_",
+    "DICT_",
+    "MAP_ADD",
+    "IMPORT_",
+)
+
+
+@lru_cache(maxsize=None)
+def is_constant_string(string: str, dependent: frozenset[str]) -> bool:
+    """
+    Check if a string evaluates to the same object in every environment with the same
+    names except the dependent ones, it reads none of them and creates no fresh objects.
+    Lambdas are constant, since their bodies only run when they are called.
+    """
+    if string.startswith(STR_PREFIX):
+        return True
+    try:
+        code = compile_string(string)
+    except (SyntaxError, ValueError):
+        return False
+    if get_names(string) & (dependent | DYNAMIC_NAMES):
+        return False
+    return not any(i.opname.startswith(FRESH_OPS) for i in dis.get_instructions(code))
+
+
+class ConstantFolder:
+    """
+    Values of constant expressions of a module config, which are evaluated once
+    and reused by every instance, see is_constant_string.
+    Values are only kept if shareable returns True for them.
+    """
+
+    def __init__(
+        self,
+        strings: Iterable[str],
+        dependent: Iterable[str],
+        shareable: Callable[[Any], bool] = lambda _: True,
+    ):
+        self.dependent = frozenset(dependent)
+        self.constants = frozenset(
+            s for s in strings if is_constant_string(s, self.dependent)
+        )
+        self.__shareable = shareable
+        self.__values: dict[str, Any] = {}
+
+    def eval(self, string: str, env: Env) -> Any:
+        """Evaluate a string in the environment, or get its value if it is folded."""
+        if string not in self.constants:
+            return eval(compile_string(string), env)
+        if string in self.__values:
+            return self.__values[string]
+        # INFO: dependent names are removed, so folded lambdas do not hold the instance
+        const_env = {k: v for k, v in env.items() if k not in self.dependent}
+        value = eval(compile_string(string), const_env)
+        if self.__shareable(value):
+            self.__values[string] = value
+        return value
+
+    def clear(self):
+        """Clear the folded values, they are evaluated again on next use."""
+        self.__values.clear()
@@ -1,5 +1,7 @@
 PYTHON_SUFFIX = [".py"]
 CONFIG_SUFFIX = [".yaml", ".yml"]
+CONFIG_CACHE_ENV = "KURISUNET_CONFIG_CACHE"  # INFO: directory of the config cache
+LOG_LEVEL_ENV = "KURISUNET_LOG_LEVEL"  # INFO: set_logger level on import, opt-in
 
 AUTO_REGISTER_KEY = "auto_register"
 GLOBAL_IMPORTS_KEY = "global_imports"
@@ -22,6 +24,10 @@ MODULE_START_INDEX = 1
 DROP_FROM = "drop"
 ALL_FROM = "all"
 
+CONVERTER_CACHE_SIZE = 128
+BUILD_PLAN_CACHE_SIZE = 128
+CONVERTER_CACHE_ATTR = "__kurisunet_cache__"
+
 STR_PREFIX = "~"
 OUTPUT_MODULE_NAME = "Output"
 BUILD_IN_IMPORT = [
@@ -1,6 +1,8 @@
+from .build import build_options
 from .module import OutputModule, PipelineModule
 
 __all__ = [
+    "build_options",
     "OutputModule",
     "PipelineModule",
 ]
@@ -0,0 +1,147 @@
+from types import FunctionType
+from typing import Any, Hashable
+
+import torch
+import torch.nn as nn
+
+try:
+    from torch.func import functional_call, vmap
+except ImportError:  # INFO: torch<2.0 has no torch.func
+    functional_call = vmap = None
+
+from ..basic.utils import to_hashable
+from ..config.utils import get_code_names
+from ..utils.logger import get_logger
+
+
+def get_value_key(value: Any, _functions: frozenset[int] = frozenset()) -> Hashable:
+    """
+    Get a hashable key of a value, functions are compared by their code, defaults,
+    closures and the globals they read. Raise TypeError if the value is not hashable.
+    """
+    key = lambda v: get_value_key(v, _functions)
+    if isinstance(value, FunctionType):
+        if id(value) in _functions:  # INFO: recursive functions read themselves
+            return (FunctionType, value.__code__)
+        key = lambda v: get_value_key(v, _functions | {id(value)})
+        cells = tuple(key(c.cell_contents) for c in value.__closure__ or ())
+        names = sorted(get_code_names(value.__code__) & value.__globals__.keys())
+        read = tuple((n, key(value.__globals__[n])) for n in names)
+        defaults = key(value.__defaults__)
+        return (FunctionType, value.__code__, defaults, cells, read)
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(key(i) for i in value))
+    if isinstance(value, dict):
+        return (type(value), tuple((k, key(v)) for k, v in value.items()))
+    return to_hashable(value)
+
+
+def _get_submodule_key(module: nn.Module) -> Hashable:
+    if module._forward_hooks or module._forward_pre_hooks:
+        raise TypeError("Modules with hooks can not be batched")
+    # INFO: private attributes are torch internals, config is in public attributes
+    attrs = {k: v for k, v in vars(module).items() if not k.startswith("_")}
+    forward_key = getattr(module, "_forward_key", None)
+    return (type(module), get_value_key(attrs), forward_key and forward_key())
+
+
+def get_batch_key(module: Any) -> Hashable | None:
+    """
+    Get the batch key of a module, modules with the same key compute the same function
+    of their own parameters and buffers, so they can be called as one vmap call.
+    None if the module has no parameters or can not be batched.
+    """
+    if not isinstance(module, nn.Module) or next(module.parameters(), None) is None:
+        return None
+    tensor_key = lambda t: (tuple(t.shape), t.dtype, t.device, t.requires_grad)
+    try:
+        return (
+            tuple(_get_submodule_key(m) for m in module.modules()),
+            tuple((k, tensor_key(v)) for k, v in module.named_parameters()),
+            tuple((k, tensor_key(v)) for k, v in module.named_buffers()),
+        )
+    except (TypeError, ValueError, RecursionError):  # INFO: ValueError for empty cells
+        return None
+
+
+def _unbind(output: Any, size: int) -> list[Any]:
+    if isinstance(output, torch.Tensor):
+        return list(output.unbind(0))
+    if isinstance(output, (list, tuple)):
+        outputs = zip(*(_unbind(o, size) for o in output))
+        return [type(output)(o) for o in outputs]
+    if isinstance(output, dict):
+        values = zip(*(_unbind(v, size) for v in output.values()))
+        return [dict(zip(output.keys(), v)) for v in values]
+    return [output] * size
+
+
+class BranchBatch:
+    """
+    Modules with the same batch key called on their own inputs as one vmap call over
+    their stacked parameters and buffers. Convolutions become one grouped convolution.
+    The modules keep their parameters, so state_dict and optimizers are not changed.
+    Modules are called separately in training mode, for inputs of different shapes,
+    or if the module can not be called with vmap.
+    """
+
+    def __init__(self, modules: list[nn.Module], num_inputs: int):
+        self.modules = tuple(modules)
+        self.num_inputs = num_inputs
+        self.enabled = True
+        self.__stacked: tuple[Hashable, dict[str, torch.Tensor]] | None = None
+
+    def __get_state(self) -> dict[str, torch.Tensor]:
+        states = [
+            {**dict(m.named_parameters()), **dict(m.named_buffers())}
+            for m in self.modules
+        ]
+        # INFO: stacking is differentiable, so it is done every call if grad is needed,
+        # otherwise stacked tensors are cached until the parameters change.
+        tensors = [t for s in states for t in s.values()]
+        if torch.is_grad_enabled() and any(t.requires_grad for t in tensors):
+            return {k: torch.stack([s[k] for s in states]) for k in states[0]}
+        key = tuple((t.data_ptr(), t._version) for t in tensors)
+        if self.__stacked is None or self.__stacked[0] != key:
+            stack = lambda k: torch.stack([s[k].detach() for s in states])
+            self.__stacked = (key, {k: stack(k) for k in states[0]})
+        return self.__stacked[1]
+
+    def __can_batch(self, inputs: list[tuple[Any, ...]]) -> bool:
+        if not self.enabled or any(m.training for m in self.modules):
+            return False
+        for same in zip(*inputs):
+            if not all(isinstance(x, torch.Tensor) for x in same):
+                return False
+            first = same[0]
+            if any(
+                x.shape != first.shape
+                or x.dtype != first.dtype
+                or x.device != first.device
+                for x in same
+            ):
+                return False
+        return True
+
+    def __call__(self, *x: Any) -> tuple[Any, ...]:
+        n = self.num_inputs
+        inputs = [x[i * n : (i + 1) * n] for i in range(len(self.modules))]
+        if self.__can_batch(inputs):
+            try:
+                module = self.modules[0]
+                call = lambda state, *args: functional_call(module, state, args)
+                stacked = [torch.stack(same) for same in zip(*inputs)]
+                output = vmap(call)(self.__get_state(), *stacked)
+                return tuple(_unbind(output, len(self.modules)))
+            except Exception as e:  # INFO: some operations have no batching rule
+                get_logger("Module").warning(
+                    f"{type(self.modules[0]).__name__} modules can not be batched, "
+                    f"they are called separately: {e}"
+                )
+                self.enabled = False
+        return tuple(m(*i) for m, i in zip(self.modules, inputs))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_BranchBatch__stacked"] = None
+        return state
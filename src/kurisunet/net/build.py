@@ -0,0 +1,166 @@
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from typing import Any, Callable, Iterator
+
+import torch
+import torch.nn as nn
+
+from ..config.types import FinalLayer
+from ..constants import LAYER_START_INDEX
+from .types import BuildOptions
+
+try:
+    from torch.overrides import TorchFunctionMode
+except ImportError:  # INFO: torch<1.13 has no function modes
+    TorchFunctionMode = None
+
+# INFO: torch<2.0 can not use a device as a context manager
+DEVICE_CONTEXT = hasattr(torch.device, "__enter__")
+
+_local = threading.local()
+
+RANDOM_FUNCS = {
+    torch.Tensor.uniform_,
+    torch.Tensor.normal_,
+    torch.Tensor.bernoulli_,
+    torch.Tensor.random_,
+    torch.Tensor.exponential_,
+    torch.Tensor.geometric_,
+    torch.Tensor.log_normal_,
+    torch.Tensor.cauchy_,
+    torch.rand,
+    torch.randn,
+    torch.randint,
+    torch.randperm,
+    torch.normal,
+    torch.bernoulli,
+    torch.multinomial,
+    torch.poisson,
+}
+# INFO: nn.init functions without random draws
+DETERMINISTIC_INITS = {"constant_", "ones_", "zeros_", "eye_", "dirac_"}
+
+
+@lru_cache(maxsize=None)
+def _accepts_generator(func: Callable[..., Any]) -> bool:
+    if func in RANDOM_FUNCS:
+        return True
+    if getattr(func, "__module__", None) != nn.init.__name__:
+        return False
+    try:
+        return "generator" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def _is_random_init(func: Callable[..., Any]) -> bool:
+    # INFO: random ops inside a handled function run without the mode, so nn.init
+    # functions draw from the global generator if they do not accept one
+    if getattr(func, "__module__", None) != nn.init.__name__:
+        return False
+    return getattr(func, "__name__", "") not in DETERMINISTIC_INITS
+
+
+if TorchFunctionMode is not None:
+
+    class GeneratorMode(TorchFunctionMode):
+        """Route random ops without explicit generator to the given generator."""
+
+        def __init__(self, generator: torch.Generator):
+            super().__init__()
+            self.generator = generator
+
+        def __torch_function__(self, func, types, args=(), kwargs=None):
+            kwargs = kwargs or {}
+            if kwargs.get("generator") is not None:
+                return func(*args, **kwargs)
+            if _accepts_generator(func):
+                kwargs = {**kwargs, "generator": self.generator}
+            elif _is_random_init(func):
+                raise ValueError(
+                    f"seeded build requires {func.__name__} with generator param, "
+                    f"which torch {torch.__version__} does not have"
+                )
+            return func(*args, **kwargs)
+
+
+def get_build_options() -> BuildOptions:
+    """Get the build options of the current thread."""
+    return getattr(_local, "options", {"workers": 0, "seed": None, "prune": False})
+
+
+@contextmanager
+def build_options(
+    workers: int = 0, seed: int | None = None, prune: bool = False
+) -> Iterator[None]:
+    """
+    Set how PipelineModule.init builds the layers in the current thread.
+    If workers > 0, the layers are instantiated on a thread pool.
+    If seed is not None, each layer uses its own generator seeded with seed + index,
+    so the weights are the same for any number of workers. Random nn.init functions
+    should accept a generator (newer torch), otherwise building raises ValueError.
+    If prune is True, layers out of the forward pass are not kept, see PipelineModule.init,
+    which requires torch>=2.0.
+    """
+    if workers < 0:
+        raise ValueError(f"workers should be non-negative, but got {workers}")
+    if workers > 0 and seed is None:
+        raise ValueError("seed is required to build layers in parallel")
+    if seed is not None and TorchFunctionMode is None:
+        raise ValueError(f"seeded build requires torch>=1.13, got {torch.__version__}")
+    if prune and not DEVICE_CONTEXT:  # INFO: pruned layers are built on meta device
+        raise ValueError(f"prune requires torch>=2.0, got {torch.__version__}")
+    old_options = getattr(_local, "options", None)
+    _local.options = {"workers": workers, "seed": seed, "prune": prune}
+    try:
+        yield
+    finally:
+        if old_options is None:
+            del _local.options
+        else:
+            _local.options = old_options
+
+
+def build_modules(
+    layers: list[FinalLayer], meta_indexes: set[int] = set()
+) -> list[nn.Module | Callable[..., Any]]:
+    """
+    Instantiate the modules of the layers with the build options.
+    Layers in meta_indexes are built on meta device without storage.
+    Indexes are starting from LAYER_START_INDEX.
+    """
+    options = get_build_options()
+    seed = options["seed"]
+
+    def build(index: int, layer: FinalLayer) -> nn.Module | Callable[..., Any]:
+        if index + LAYER_START_INDEX in meta_indexes:
+            context = torch.device("meta")
+        elif seed is None:
+            context = nullcontext()
+        else:
+            # INFO: generator should be on the default device of the random ops
+            generator = torch.Generator(device=torch.empty(0).device)
+            context = GeneratorMode(generator.manual_seed(seed + index))
+        # INFO: nested layers are built serially with the generator of the outermost
+        # layer, so the weights do not depend on the thread building them.
+        with context, build_options(prune=options["prune"]):
+            return layer["module"](*layer["args"], **layer["kwargs"])
+
+    if options["workers"] == 0 or len(layers) < 2:
+        return [build(i, l) for i, l in enumerate(layers)]
+    # INFO: default device is thread-local too, so pass it to the workers
+    device = torch.empty(0).device
+
+    def build_on_device(
+        index: int, layer: FinalLayer
+    ) -> nn.Module | Callable[..., Any]:
+        # INFO: torch<2.0 has no default device to pass
+        with torch.device(device) if DEVICE_CONTEXT else nullcontext():
+            return build(index, layer)
+
+    with ThreadPoolExecutor(options["workers"]) as executor:
+        return list(executor.map(build_on_device, range(len(layers)), layers))
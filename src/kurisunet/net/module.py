@@ -1,21 +1,37 @@
-from typing import Any, Callable, Iterable, cast
+from collections import Counter
+from typing import Any, Callable, Hashable, Iterable, cast
 
+import torch
+import torch.fx as fx
 import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 from ..config.types import FinalLayer, FromTuple
 from ..constants import ALL_FROM
-from ..utils.logger import get_logger
-from .types import ModuleMeta
+from ..utils.logger import get_logger, is_enabled
+from .batch import BranchBatch, get_batch_key, get_value_key, vmap
+from .build import DEVICE_CONTEXT, build_modules, get_build_options
+from .profile import LayerProfile
+from .tracer import PipelineTracer
+from .types import ModuleMeta, ProfileRow
 from .utils import auto_unpack, get_same_indexes, module_enum
 from .utils import (
-    get_drop_layer_indexes,
-    get_except_indexes,
-    get_unused_layer_indexes,
+    analyze_layers,
+    compile_forward,
+    get_batch_position,
+    get_layer_depths,
     layer_enum,
     regularize_layer_from,
 )
 
 
+CONV_BN_PAIRS = (
+    (nn.Conv1d, nn.BatchNorm1d),
+    (nn.Conv2d, nn.BatchNorm2d),
+    (nn.Conv3d, nn.BatchNorm3d),
+)
+
+
 def OutputModule(*args: Any) -> tuple[Any, ...] | Any:
     """Output module."""
     return auto_unpack(args)
@@ -36,6 +52,7 @@ class PipelineModule(nn.Module):
         self,
         modules: Iterable[nn.Module | Callable[..., Any]],
         forward_drop: set[int] = set(),
+        prune: bool = False,
     ) -> None:
         logger = get_logger("Module")
 
@@ -59,14 +76,17 @@ class PipelineModule(nn.Module):
             )
             forward_drop = remove_same_drop(forward_drop, i, same)
 
+        same_indexes = {i for s in same_dict.values() for i in s}
         is_module = lambda p: isinstance(p[1], nn.Module)
-        not_same = lambda p: p[0] not in {i for s in same_dict.values() for i in s}
+        not_same = lambda p: p[0] not in same_indexes
         indexed_module = filter(is_module, layer_enum(modules))
         indexed_module = filter(not_same, indexed_module)
         reindexed_module = list(module_enum(indexed_module))
         for module_index, (layer_index, module) in reindexed_module:
             module = cast(nn.Module, module)
             if layer_index in forward_drop:
+                if prune:
+                    continue  # INFO: module indexes are kept the same as without prune
                 self.__meta["drop_set"].add(module_index)
             self.add_module(str(module_index), module)
 
@@ -74,6 +94,7 @@ class PipelineModule(nn.Module):
         """Lazy initialization of the pipeline module."""
         super().__init__()
         self.__meta: ModuleMeta = {"name": "PipelineModule", "drop_set": set()}
+        self.__profile: LayerProfile | None = None
 
     def init(
         self,
@@ -81,52 +102,268 @@ class PipelineModule(nn.Module):
         layers: tuple[FinalLayer, ...],
         buffers: dict[str, Any] | None = None,
         params: dict[str, Any] | None = None,
+        prune: bool | None = None,
     ):
-        """Real initialization of the pipeline module."""
+        """
+        Real initialization of the pipeline module.
+        If prune is True, drop, unused layers and layers only used by them are built
+        on meta device and not registered, other modules keep their indexes so that
+        weights of the full module can be loaded with strict=False, it requires torch>=2.0.
+        nn.Identity and OutputModule pass-throughs are also removed from forward pass.
+        If prune is None, it is taken from build_options.
+        """
         logger = get_logger("Module")
         self.__meta["name"] = name
         self.__register_buffers(buffers or {})
         self.__register_params(params or {})
 
         layers = regularize_layer_from(layers)
-        if forward_drop := get_drop_layer_indexes(layers):
+        graph = analyze_layers(layers)
+        if forward_drop := graph["drop_set"]:
             logger.info(
                 f"layers with indexes {forward_drop} are set "
                 f"to be dropped in forward pass"
             )
-        if forward_unused := get_unused_layer_indexes(layers):
+        if forward_unused := graph["unused_set"]:
             logger.warning(
                 f"layers with indexes {forward_unused} are not "
                 f"connected to any other layers and will be dropped in forward pass"
             )
+        forward_except = forward_drop.union(forward_unused)
+        prune = get_build_options()["prune"] if prune is None else prune
+        if prune and not DEVICE_CONTEXT:
+            raise ValueError(f"prune requires torch>=2.0, got {torch.__version__}")
+        if prune:
+            if forward_dead := graph["dead_set"].difference(forward_unused):
+                logger.info(
+                    f"layers with indexes {forward_dead} are only used "
+                    f"by unused layers and will be dropped in forward pass"
+                )
+            forward_except = forward_except.union(forward_dead)
+            logger.info(f"layers with indexes {forward_except} are pruned")
         # INFO: register all modules to load state_dict without drop
-        all_modules = [l["module"](*l["args"], **l["kwargs"]) for l in layers]
-        self.__register_modules(all_modules, forward_drop.union(forward_unused))
+        all_modules = build_modules(layers, forward_except if prune else set())
+        self.__register_modules(all_modules, forward_except, prune)
 
-        layers = get_except_indexes(layers, forward_drop)
-        from_list = cast(list[FromTuple], [l["from"] for l in layers])
-        modules = get_except_indexes(all_modules, forward_drop)
+        forward_index = graph["forward_index"]
         self.__modules = tuple(
-            (i, (f, m))
-            for i, (f, m) in layer_enum(zip(from_list, modules))
-            if i not in get_unused_layer_indexes(layers)
+            (forward_index[i], (cast(FromTuple, l["from"]), m))
+            for i, (l, m) in layer_enum(zip(layers, all_modules))
+            if i not in forward_except
         )
+        if prune:
+            self.__modules = self.__remove_pass_through(self.__modules)
+            self.__compile_forward()
+        else:
+            self.__compile_forward(graph["last_used"])
 
+        if not is_enabled("SubModules", "DEBUG"):
+            return
         logger = get_logger("SubModules")
         if submodule_str := self.get_submodules_str():
             logger.debug(f"{name} is created with submodules:\n{submodule_str}")
         else:
             logger.debug(f"{name} is created without submodules")
 
+    @staticmethod
+    def __remove_pass_through(
+        modules: tuple[tuple[int, tuple[FromTuple, Any]], ...],
+    ) -> tuple[tuple[int, tuple[FromTuple, Any]], ...]:
+        # INFO: the last layer is kept as the output of the forward pass
+        is_pass = lambda m: type(m) is nn.Identity or m is OutputModule
+        redirect: dict[int, int] = {}
+        kept = []
+        for n, (i, (from_, m)) in enumerate(modules, start=1):
+            from_ = tuple((redirect.get(k, k), v) for k, v in from_)
+            single = len(from_) == 1 and from_[0][1] == ALL_FROM
+            if n < len(modules) and single and is_pass(m):
+                redirect[i] = from_[0][0]
+                continue
+            kept.append((i, (from_, m)))
+        return tuple(kept)
+
+    def __compile_forward(self, last_used: dict[int, int] | None = None):
+        # INFO: results are released right after their last consumer,
+        # which reduces peak memory when torch graph does not reference them.
+        self.__forward_modules = tuple(m for _, (_, m) in self.__modules)
+        from_list = [(i, f) for i, (f, _) in self.__modules]
+        profile = self.__dict__.get("_PipelineModule__profile")
+        if profile is not None and profile.indexes != [i for i, _ in from_list]:
+            profile = self.__profile = LayerProfile([i for i, _ in from_list])
+        self.__forward = compile_forward(from_list, last_used, profile)
+
     def forward(self, *x: Any) -> Any:
         """Forward pass through the pipeline module."""
-        # INFO: because of torch graph will reference to the all tensors in forward pass,
-        # save all results in a dict does not increase memory usage.
-        results: dict[int, Any] = {0: x[0] if len(x) == 1 else x}
-        for i, (f, m) in self.__modules:
-            x = m(*(results[k] if v == ALL_FROM else results[k][v] for k, v in f))
-            results[i] = x
-        return x
+        return self.__forward(self.__forward_modules, x)
+
+    def to_fx(self, num_inputs: int = 1) -> fx.GraphModule:
+        """
+        Export the pipeline module to a torch.fx GraphModule.
+        Nested PipelineModule are flattened and parameter names are kept.
+        """
+        graph = PipelineTracer(num_inputs).trace(self)
+        return fx.GraphModule(self, graph, self.get_module_name())
+
+    def fuse_conv_bn(self) -> int:
+        """
+        Fold BatchNorm layers into the Conv layers they directly follow, for inference.
+        The Conv result should only be used by the BatchNorm, and neither of them shared.
+        Return the number of folded pairs.
+        """
+        if self.training:
+            raise ValueError("Conv and BatchNorm can only be fused in eval mode")
+        modules = list(self.__modules)
+        used = Counter(k for _, (from_, _) in modules for k, _ in from_)
+        shared = Counter(id(m) for _, (_, m) in modules)
+        is_pair = lambda c, b: any(
+            isinstance(c, conv) and isinstance(b, bn) for conv, bn in CONV_BN_PAIRS
+        )
+        redirect: dict[int, int] = {}
+        fused: dict[int, nn.Module] = {}
+        for (conv_i, (_, conv)), (bn_i, (bn_from, bn)) in zip(modules, modules[1:]):
+            if not is_pair(conv, bn) or bn_from != ((conv_i, ALL_FROM),):
+                continue
+            if used[conv_i] != 1 or shared[id(conv)] != 1 or shared[id(bn)] != 1:
+                continue
+            if conv_i in fused or not bn.track_running_stats:
+                continue
+            fused[conv_i] = fuse_conv_bn_eval(conv, bn)  # type: ignore
+            redirect[bn_i] = conv_i
+            for k, m in list(self._modules.items()):
+                if m is conv:
+                    self._modules[k] = fused[conv_i]
+                elif m is bn:
+                    del self._modules[k]
+                    self.__meta["drop_set"].discard(int(k))
+        if not fused:
+            return 0
+
+        get_logger("Module").debug(
+            f"BatchNorm layers {sorted(redirect)} of {self.__meta['name']} "
+            f"are folded into Conv layers {sorted(redirect.values())}"
+        )
+        new_from = lambda f: tuple((redirect.get(k, k), v) for k, v in f)
+        self.__modules = tuple(
+            (i, (new_from(f), fused.get(i, m)))
+            for i, (f, m) in modules
+            if i not in redirect
+        )
+        self.__compile_forward()
+        return len(fused)
+
+    def batch_branches(self, min_size: int = 2) -> int:
+        """
+        Call sibling layers as one vmap call over their stacked parameters, for inference.
+        Layers are batched if they have the same depth from the input, the same number
+        of inputs and the same batch key, see net.batch.get_batch_key, for example
+        repeated Bottleneck after a chunk or parallel heads.
+        Parameters are not changed, so state_dict is the same and weights can be loaded.
+        Other layers keep their order, layers are not batched if moving them changes
+        what a later layer or an in-place layer (inplace=True) sees.
+        Batched layers are called separately in training mode, fuse_conv_bn and to_fx
+        should be called before. Return the number of batched groups.
+        """
+        if vmap is None:
+            version = torch.__version__
+            raise ValueError(f"batch_branches requires torch>=2.0, got {version}")
+        modules = list(self.__modules)
+        depths = get_layer_depths((i, f) for i, (f, _) in modules)
+        inplace = {i for i, (_, m) in modules if getattr(m, "inplace", False) is True}
+        candidates: dict[Hashable, list[int]] = {}
+        for i, (from_, m) in modules[:-1]:
+            if (key := get_batch_key(m)) is not None:
+                candidates.setdefault((depths[i], len(from_), key), []).append(i)
+
+        # INFO: each group is called right after the inputs of its members, results of
+        # members are taken at their positions or right after the call if it is later,
+        # so other layers keep their order.
+        groups: list[list[int]] = []
+        g = max(i for i, _ in modules)
+        for group in (c for c in candidates.values() if len(c) >= min_size):
+            from_list = [(i, f) for i, (f, _) in modules]
+            call, members = get_batch_position(from_list, group, inplace)
+            if len(members) < min_size:
+                continue
+            g += 1
+            layers = dict(modules)
+            from_ = tuple(k for i in members for k in layers[i][0])
+            batch = BranchBatch(
+                [layers[i][1] for i in members], len(layers[members[0]][0])
+            )
+            picks = {i: (i, (((g, j),), OutputModule)) for j, i in enumerate(members)}
+            moved = [i for p, (i, _) in enumerate(modules) if i in picks and p < call]
+            entries = []
+            for p, (i, layer) in enumerate(modules):
+                if p == call:
+                    entries.append((g, (from_, batch)))
+                    entries.extend(picks[j] for j in moved)
+                if i not in picks:
+                    entries.append((i, layer))
+                elif p >= call:
+                    entries.append(picks[i])
+            modules = entries
+            groups.append(members)
+        if not groups:
+            return 0
+        self.__modules = tuple(modules)
+        self.__compile_forward()
+        name = self.__meta["name"]
+        get_logger("Module").debug(f"layers {groups} of {name} are batched")
+        return len(groups)
+
+    def _forward_key(self) -> Hashable:
+        """Get the key of the forward pass structure, used by net.batch.get_batch_key."""
+        return tuple(
+            (i, f, type(m) if isinstance(m, nn.Module) else get_value_key(m))
+            for i, (f, m) in self.__modules
+        )
+
+    def profile(self, enabled: bool = True):
+        """
+        Enable or disable per-layer profiling of this and nested PipelineModule.
+        Enabling resets the statistics, the forward pass is not changed when disabled.
+        """
+        for m in self.modules():
+            if not isinstance(m, PipelineModule):
+                continue
+            indexes = [i for i, _ in m.__modules]
+            m.__profile = LayerProfile(indexes) if enabled else None
+            m.__compile_forward()
+
+    def get_profile(self, prefix: str | None = None) -> list[ProfileRow]:
+        """
+        Get per-layer profile rows with name paths like YOLOv12.3.Conv.1,
+        where 3 is the layer index in forward pass, rows of nested layers follow their parent.
+        Times of a layer include its nested layers.
+        """
+        prefix = self.get_module_name() if prefix is None else prefix
+        if (profile := self.__profile) is None:
+            return []
+        rows: list[ProfileRow] = []
+        for slot, (i, (_, m)) in enumerate(self.__modules):
+            path = f"{prefix}.{i}"
+            if isinstance(m, PipelineModule):
+                name = m.get_module_name()
+            elif isinstance(m, nn.Module):
+                name = type(m).__name__
+            else:
+                name = getattr(m, "__name__", type(m).__name__)
+            rows.append(
+                {
+                    "path": path,
+                    "module": name,
+                    "calls": profile.calls[slot],
+                    "wall_ns": profile.wall_ns[slot],
+                    "cpu_ns": profile.cpu_ns[slot],
+                    "output_bytes": profile.output_nbytes[slot],
+                    "shape": profile.shapes[slot],
+                    "start_ns": profile.start_ns[slot],
+                    "last_wall_ns": profile.last_wall_ns[slot],
+                }
+            )
+            if isinstance(m, PipelineModule):
+                rows.extend(m.get_profile(f"{path}.{name}"))
+        return rows
 
     def add_drop(self, indexes: Iterable[int] | int):
         """Add submodules indexes to drop_set."""
@@ -153,15 +390,18 @@ class PipelineModule(nn.Module):
 
     def resort(self):
         """Resort the submodules."""
+        verbose = is_enabled("Module", "DEBUG")
         logger = get_logger("Module")
-        logger.debug("Submodules before resorting:\n" + self.get_submodules_str())
+        if verbose:
+            logger.debug("Submodules before resorting:\n" + self.get_submodules_str())
         modules = self._modules.copy()
         for k in modules.keys():
             del self._modules[k]
         for i, k in module_enum(sorted(modules.keys(), key=lambda x: int(x))):
             self.add_module(str(i), modules[k])
         del modules
-        logger.debug("Submodules after resorting:\n" + self.get_submodules_str())
+        if verbose:
+            logger.debug("Submodules after resorting:\n" + self.get_submodules_str())
 
     def get_module_name(self) -> str:
         """Get the module name."""
@@ -172,6 +412,17 @@ class PipelineModule(nn.Module):
         lines = str(self).split("\n")[1:-1]  # remove outermost brackets
         return "\n".join([s[2:] for s in lines])  # remove leading spaces
 
+    def __getstate__(self):
+        # INFO: compiled forward function can not be pickled, compile it again on load
+        state = self.__dict__.copy()
+        state.pop("_PipelineModule__forward", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if "_PipelineModule__modules" in self.__dict__:
+            self.__compile_forward()
+
     def __repr__(self):
         """Get the string representation of the module."""
         lines = super().__repr__().split("\n")
@@ -0,0 +1,56 @@
+from array import array
+from time import perf_counter_ns, process_time_ns
+from typing import Any
+
+import torch
+
+
+def _get_shapes(x: Any) -> Any:
+    if isinstance(x, torch.Tensor):
+        return tuple(x.shape)
+    if isinstance(x, (list, tuple)):
+        return tuple(_get_shapes(i) for i in x)
+    return None
+
+
+def _get_nbytes(x: Any) -> int:
+    if isinstance(x, torch.Tensor):
+        return x.numel() * x.element_size()
+    if isinstance(x, (list, tuple)):
+        return sum(_get_nbytes(i) for i in x)
+    return 0
+
+
+class LayerProfile:
+    """
+    Per-layer statistics of forward passes in preallocated arrays.
+    Times are in nanoseconds, cpu time counts all threads of the process.
+    Output bytes are the sizes of output tensors, not memory allocated by the layer,
+    start and last wall time are of the last call.
+    """
+
+    def __init__(self, indexes: list[int]):
+        self.indexes = indexes
+        self.reset()
+
+    def reset(self):
+        """Reset all statistics."""
+        zeros = lambda: array("q", bytes(8 * len(self.indexes)))
+        self.calls = zeros()
+        self.wall_ns = zeros()
+        self.cpu_ns = zeros()
+        self.output_nbytes = zeros()
+        self.start_ns = zeros()
+        self.last_wall_ns = zeros()
+        self.shapes: list[Any] = [None] * len(self.indexes)
+
+    def record(self, slot: int, wall_start: int, cpu_start: int, output: Any):
+        """Record a call of the layer at slot, which started at wall_start and cpu_start."""
+        wall = perf_counter_ns() - wall_start
+        self.cpu_ns[slot] += process_time_ns() - cpu_start
+        self.wall_ns[slot] += wall
+        self.calls[slot] += 1
+        self.start_ns[slot] = wall_start
+        self.last_wall_ns[slot] = wall
+        self.output_nbytes[slot] += _get_nbytes(output)
+        self.shapes[slot] = _get_shapes(output)
@@ -0,0 +1,28 @@
+from typing import Any, Callable
+
+import torch.fx as fx
+
+
+class PipelineTracer(fx.Tracer):
+    """
+    Tracer for modules with variadic forward like PipelineModule.
+    Nested PipelineModule are not leaf modules, so they are flattened into the graph.
+    """
+
+    def __init__(self, num_inputs: int = 1):
+        super().__init__()
+        self.num_inputs = num_inputs
+
+    def create_args_for_root(
+        self,
+        root_fn: Callable[..., Any],
+        is_module: bool,
+        concrete_args: Any = None,
+    ) -> tuple[Callable[..., Any], list[Any]]:
+        """Create a fixed number of placeholders instead of tracing *args."""
+        if self.num_inputs == 1:
+            names = ["x"]
+        else:
+            names = [f"x{i}" for i in range(self.num_inputs)]
+        inputs = [self.create_proxy("placeholder", n, (), {}) for n in names]
+        return root_fn, [self.root, *inputs] if is_module else inputs
@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Any, TypedDict
 
 
 ModuleMeta = TypedDict(
@@ -8,3 +8,40 @@ ModuleMeta = TypedDict(
         "drop_set": set[int],
     },
 )
+
+BuildOptions = TypedDict(
+    "BuildOptions",
+    {
+        "workers": int,
+        "seed": int | None,
+        "prune": bool,
+    },
+)
+
+LayerGraph = TypedDict(
+    "LayerGraph",
+    {
+        "drop_set": set[int],
+        "unused_set": set[int],
+        "dead_set": set[int],
+        "forward_index": dict[int, int],
+        "predecessors": dict[int, tuple[int, ...]],
+        "successors": dict[int, list[int]],
+        "last_used": dict[int, int],
+    },
+)
+
+ProfileRow = TypedDict(
+    "ProfileRow",
+    {
+        "path": str,
+        "module": str,
+        "calls": int,
+        "wall_ns": int,
+        "cpu_ns": int,
+        "output_bytes": int,
+        "shape": Any,
+        "start_ns": int,
+        "last_wall_ns": int,
+    },
+)
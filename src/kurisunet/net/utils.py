@@ -1,10 +1,12 @@
 from copy import copy
-from itertools import combinations
-from typing import Any, Counter, Iterable, TypeVar, cast
+from time import perf_counter_ns, process_time_ns
+from typing import Any, Callable, Iterable, TypeVar, cast
 
 from ..config.module import is_drop_key
 from ..config.types import FinalLayer, FromTuple
-from ..constants import LAYER_START_INDEX, MODULE_START_INDEX
+from ..constants import ALL_FROM, LAYER_START_INDEX, MODULE_START_INDEX
+from .profile import LayerProfile
+from .types import LayerGraph
 
 T = TypeVar("T")
 
@@ -54,7 +56,7 @@ def regularize_layer_from(layers: Iterable[FinalLayer]) -> tuple[FinalLayer, ...
 
         return tuple((regularize_key(index, k), v) for k, v in from_)
 
-    all_layers = copy(list(layers))
+    all_layers = [copy(l) for l in layers]  # INFO: do not modify the input layers
     layers = [l for l in all_layers if not isinstance(l["from"], str)]
     for i, layer in layer_enum(layers):
         from_ = cast(FromTuple, layer["from"])
@@ -62,32 +64,62 @@ def regularize_layer_from(layers: Iterable[FinalLayer]) -> tuple[FinalLayer, ...
     return tuple(all_layers)
 
 
-def get_unused_layer_indexes(layers: Iterable[FinalLayer]) -> set[int]:
+def analyze_layers(layers: Iterable[FinalLayer]) -> LayerGraph:
     """
-    Get the indexes of the layers that are not used by other layers.
+    Analyze the connections of the layers in a single pass.
     Layers should be converted to absolute indexes before.
-    Layers with string "from" will be ignored.
+    "drop_set", "unused_set" and "dead_set" use the indexes of all layers, "forward_index" maps them to the indexes of layers without drop, which are used by the others.
+    "dead_set" is the unused layers and the layers only used by them, which do not reach the output.
+    Unused layers are not counted in "successors" and "last_used".
     """
+    drop_set: set[int] = set()
+    forward_index: dict[int, int] = {}
+    predecessors: dict[int, tuple[int, ...]] = {}
+    for i, layer in layer_enum(layers):
+        if isinstance(layer["from"], str):
+            drop_set.add(i)
+            continue
+        index = forward_index[i] = len(forward_index) + LAYER_START_INDEX
+        from_ = cast(FromTuple, layer["from"])
+        predecessors[index] = tuple(dict.fromkeys(k for k, _ in from_))
+
+    used = {k for keys in predecessors.values() for k in keys}
+    last_index = len(forward_index) + LAYER_START_INDEX - 1
+    unused = set(predecessors).difference(used).difference({last_index})
+
+    live = {last_index} if predecessors else set()
+    for index in reversed(predecessors):
+        if index in live:
+            live.update(predecessors[index])
+    dead = set(predecessors).difference(live)
+
+    successors: dict[int, list[int]] = {}
+    last_used: dict[int, int] = {}
+    for index, keys in predecessors.items():
+        if index in unused:
+            continue
+        for k in keys:
+            successors.setdefault(k, []).append(index)
+            last_used[k] = index
 
-    def get_used_indexes(from_list: list[FromTuple]) -> set[int]:
-        key_list = [[k for k, _ in from_] for from_ in from_list]
-        use_count = [Counter(f) for f in key_list]
-        return set(sum(use_count, Counter()).keys())
-
-    layer_range = lambda l: range(LAYER_START_INDEX, len(l) + LAYER_START_INDEX)
-
-    indexed_all_layers = layer_enum(copy(list(layers)))
-    not_str_layer = lambda p: not isinstance(p[1]["from"], str)
-    indexed_layers = list(filter(not_str_layer, indexed_all_layers))
-    from_list = cast(list[FromTuple], [l["from"] for _, l in indexed_layers])
+    return {
+        "drop_set": drop_set,
+        "unused_set": {i for i, index in forward_index.items() if index in unused},
+        "dead_set": {i for i, index in forward_index.items() if index in dead},
+        "forward_index": forward_index,
+        "predecessors": predecessors,
+        "successors": successors,
+        "last_used": last_used,
+    }
 
-    used_indexes = get_used_indexes(from_list)
-    all_indexes = set(layer_range(from_list))
-    last_index = len(from_list) + LAYER_START_INDEX - 1
-    unused_indexes = all_indexes.difference(used_indexes).difference({last_index})
 
-    index_dict = {i: p[0] for i, p in zip(layer_range(indexed_layers), indexed_layers)}
-    return {index_dict[i] for i in unused_indexes}
+def get_unused_layer_indexes(layers: Iterable[FinalLayer]) -> set[int]:
+    """
+    Get the indexes of the layers that are not used by other layers.
+    Layers should be converted to absolute indexes before.
+    Layers with string "from" will be ignored.
+    """
+    return analyze_layers(layers)["unused_set"]
 
 
 def get_same_indexes(iterable: Iterable[T]) -> dict[int, set[int]]:
@@ -97,10 +129,120 @@ def get_same_indexes(iterable: Iterable[T]) -> dict[int, set[int]]:
     Indexes are starting from LAYER_START_INDEX.
     """
 
+    first_dict: dict[int, int] = {}  # INFO: id of the element -> first index
     same_dict: dict[int, set[int]] = {}
-    sames = lambda d: {i for same in d.values() for i in same}
-    for (i, item1), (j, item2) in combinations(layer_enum(iterable), 2):
-        if item1 is not item2 or i in sames(same_dict):
-            continue
-        same_dict[i] = same_dict.get(i, set()) | {j}
+    for i, item in layer_enum(iterable):
+        first = first_dict.setdefault(id(item), i)
+        if first != i:
+            same_dict.setdefault(first, set()).add(i)
     return same_dict
+
+
+def get_last_used_indexes(from_list: Iterable[tuple[int, FromTuple]]) -> dict[int, int]:
+    """
+    Get the index of the last layer using the result of each layer.
+    It will return a dictionary where the keys are the indexes of the used results and the values are the indexes of their last consumers.
+    Layers should be converted to absolute indexes before.
+    """
+    return {k: i for i, from_ in from_list for k, _ in from_}
+
+
+def get_layer_depths(from_list: Iterable[tuple[int, FromTuple]]) -> dict[int, int]:
+    """
+    Get the depth of each layer, which is the length of the longest path from the input.
+    Layers with the same depth never use the results of each other, even indirectly.
+    Layers should be converted to absolute indexes before.
+    """
+    depths = {0: 0}
+    for i, from_ in from_list:
+        depths[i] = 1 + max(depths.get(k, 0) for k, _ in from_)
+    return depths
+
+
+def get_batch_position(
+    from_list: list[tuple[int, FromTuple]], members: Iterable[int], inplace: set[int]
+) -> tuple[int, list[int]]:
+    """
+    Get the position in from_list to call batched layers and the members batched there,
+    which is right after the last layer producing their inputs.
+    A member is kept only if layers between its position and the call do not read
+    its result, and are not in inplace if they read its inputs, so the order of
+    other layers is kept and in-place layers see the same values.
+    Layers should be converted to absolute indexes before.
+    """
+    position = {i: p for p, (i, _) in enumerate(from_list)}
+    inputs = {i: {k for k, _ in from_list[position[i]][1]} for i in members}
+
+    def is_kept(i: int, call: int, members: list[int]) -> bool:
+        p = position[i]
+        between = from_list[p + 1 : call] if p < call else from_list[call:p]
+        for j, from_ in between:
+            read = {k for k, _ in from_}
+            if j in members:
+                continue  # INFO: other members are called with the batch
+            if i in read or (j in inplace and read & inputs[i]):
+                return False
+        return True
+
+    members = list(inputs)
+    while True:
+        producers = (position.get(k, -1) for i in members for k in inputs[i])
+        call = 1 + max(producers, default=-1)
+        kept = [i for i in members if is_kept(i, call, members)]
+        if kept == members:
+            return call, members
+        members = kept
+
+
+ForwardFunc = Callable[[tuple[Any, ...], tuple[Any, ...]], Any]
+
+
+def compile_forward(
+    from_list: Iterable[tuple[int, FromTuple]],
+    last_used: dict[int, int] | None = None,
+    profile: LayerProfile | None = None,
+) -> ForwardFunc:
+    """
+    Compile the layer from indexes into a straight-line forward function.
+    The compiled function takes the modules tuple and the input tuple, results are released right after their last consumer.
+    Layers should be converted to absolute indexes before.
+    Use `last_used` from analyze_layers to skip computing it again.
+    If `profile` is given, each layer call is recorded to it by its position in `from_list`.
+    """
+
+    def get_input(k: int, v: int | str) -> str:
+        return f"r{k}" if v == ALL_FROM else f"r{k}[{v!r}]"
+
+    from_list = list(from_list)
+    if not from_list:
+        return lambda m, x: x
+
+    if last_used is None:
+        last_used = get_last_used_indexes(from_list)
+    free_dict: dict[int, list[int]] = {}
+    for k, i in last_used.items():
+        free_dict.setdefault(i, []).append(k)
+
+    module_names = ", ".join(f"m{i}" for i, _ in from_list)
+    lines = [
+        "def forward(m, x):",
+        f"    {module_names}, = m",
+        "    r0 = x[0] if len(x) == 1 else x",
+    ]
+    for slot, (i, from_) in enumerate(from_list):
+        inputs = ", ".join(get_input(k, v) for k, v in from_)
+        if profile is None:
+            lines.append(f"    r{i} = m{i}({inputs})")
+        else:
+            lines.append("    w, c = wall(), cpu()")
+            lines.append(f"    r{i} = m{i}({inputs})")
+            lines.append(f"    record({slot}, w, c, r{i})")
+        if free := sorted(free_dict.get(i, [])):
+            lines.append(f"    del {', '.join(f'r{k}' for k in free)}")
+    lines.append(f"    return r{from_list[-1][0]}")
+
+    env: dict[str, Any] = {}
+    if profile is not None:
+        env.update(wall=perf_counter_ns, cpu=process_time_ns, record=profile.record)
+    exec(compile("\n".join(lines), "<pipeline_forward>", "exec"), env)
+    return env["forward"]
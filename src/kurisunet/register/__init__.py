@@ -1,16 +1,26 @@
 from .register import (
     ConverterRegister,
     ModuleRegister,
+    Registry,
+    get_registry,
+    new_registry,
     register_converter,
     register_module,
+    uncached_converter,
+    use_registry,
 )
 from .register_config import get_module, register_config
 
 __all__ = [
     "ConverterRegister",
     "ModuleRegister",
+    "Registry",
+    "get_registry",
+    "new_registry",
     "register_converter",
     "register_module",
+    "uncached_converter",
+    "use_registry",
     "get_module",
     "register_config",
 ]
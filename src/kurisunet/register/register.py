@@ -1,98 +1,277 @@
-from copy import copy
-from typing import Callable
+import builtins
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, Literal, Mapping
 
 from ..basic.types import Env
+from ..basic.utils import merge_envs
 from ..config.types import CustomModule, Module
-from ..constants import OUTPUT_MODULE_NAME
+from ..constants import CONVERTER_CACHE_ATTR, OUTPUT_MODULE_NAME
 from ..net import OutputModule
 from ..utils.logger import get_logger
 
 logger = get_logger("Register")
 
+RegisterModule = Module | CustomModule
+RegisterKind = Literal["module", "converter"]
+KINDS: tuple[RegisterKind, ...] = ("module", "converter")
+
+
+class Registry:
+    """
+    Scope of registered modules and converters.
+    Names are looked up in the scope first and then in its parents,
+    so a child scope can register names of its parents without changing them.
+    Merged environments are cached until the scope or any of its parents changes.
+    """
+
+    def __init__(self, name: str = "Registry", parent: "Registry | None" = None):
+        self.name = name
+        self.parent = parent
+        self.__items: dict[RegisterKind, dict[str, Any]] = {k: {} for k in KINDS}
+        self.__frozen = False
+        self.__version = 0
+        self.__envs: dict[Any, tuple[tuple[int, ...], Any]] = {}
+
+    def __versions(self) -> tuple[int, ...]:
+        registry, versions = self, []
+        while registry is not None:
+            versions.append(registry.__version)
+            registry = registry.parent
+        return tuple(versions)
+
+    def __cached(self, key: Any, build: Callable[[], Any]) -> Any:
+        versions = self.__versions()
+        cached = self.__envs.get(key)
+        if cached is None or cached[0] != versions:
+            cached = self.__envs[key] = (versions, build())
+        return cached[1]
+
+    def __register(self, kind: RegisterKind, name: str, obj: Any):
+        if self.__frozen:
+            raise ValueError(f"Registry {self.name} is frozen, can not register {name}")
+        if name in self.__items[kind]:
+            raise ValueError(f"{kind.capitalize()} {name} is already registered")
+        self.__items[kind][name] = obj
+        self.__version += 1
+        logger.debug(f"{kind.capitalize()} {name} registered successfully")
+
+    def __get(self, kind: RegisterKind, name: str) -> Any:
+        env = self.get_env(kind)
+        if name not in env:
+            raise ValueError(f"{kind.capitalize()} {name} is not registered")
+        return env[name]
+
+    def __clear(self, kind: RegisterKind):
+        if self.__frozen:
+            raise ValueError(f"Registry {self.name} is frozen, can not be cleared")
+        self.__items[kind].clear()
+        self.__version += 1
+
+    def register_module(self, name: str, module: RegisterModule):
+        """Register a module with a name in this scope."""
+        self.__register("module", name, module)
+
+    def register_converter(self, name: str, converter: Callable):
+        """Register a converter with a name in this scope."""
+        self.__register("converter", name, converter)
+
+    def get_module(self, name: str) -> RegisterModule:
+        """Get a module by name from this scope or its parents."""
+        return self.__get("module", name)
+
+    def get_converter(self, name: str) -> Callable:
+        """Get a converter by name from this scope or its parents."""
+        return self.__get("converter", name)
+
+    def has_module(self, name: str) -> bool:
+        """Check if a module is registered in this scope or its parents."""
+        return name in self.get_env("module")
+
+    def has_converter(self, name: str) -> bool:
+        """Check if a converter is registered in this scope or its parents."""
+        return name in self.get_env("converter")
+
+    def clear_modules(self):
+        """Clear the modules registered in this scope, parents are not changed."""
+        self.__clear("module")
+
+    def clear_converters(self):
+        """Clear the converters registered in this scope, parents are not changed."""
+        self.__clear("converter")
+
+    def clear(self):
+        """Clear the modules and converters registered in this scope."""
+        self.clear_modules()
+        self.clear_converters()
+
+    def is_frozen(self) -> bool:
+        """Check if the registry is an immutable snapshot."""
+        return self.__frozen
+
+    def get_env(self, kind: RegisterKind = "module") -> Mapping[str, Any]:
+        """Get the read-only environment of this scope merged with its parents."""
+
+        def build() -> Mapping[str, Any]:
+            if self.parent is None:
+                return MappingProxyType(self.__items[kind])
+            return MappingProxyType({**self.parent.get_env(kind), **self.__items[kind]})
+
+        return self.__cached(kind, build)
+
+    def get_builtins_env(self, with_converters: bool = False) -> Env:
+        """
+        Get python builtins with registered modules (and converters) for config expressions.
+        It is used as __builtins__ of the environment, so registers are not copied for every module.
+        """
+
+        def build() -> Env:
+            envs = [vars(builtins), self.get_env("module")]
+            if with_converters:
+                envs.append(self.get_env("converter"))
+            return merge_envs(envs)
+
+        return self.__cached(("builtins", with_converters), build)
+
+    def child(self, name: str = "Registry") -> "Registry":
+        """Create a child scope, which sees the names of this scope without copying them."""
+        return Registry(name, self)
+
+    def snapshot(self, name: str | None = None) -> "Registry":
+        """
+        Create an immutable registry with the names visible from this scope.
+        It does not follow later changes and can be shared as the parent of many scopes.
+        """
+        snapshot = Registry(name or f"{self.name}Snapshot")
+        for kind in KINDS:
+            snapshot.__items[kind].update(self.get_env(kind))
+        snapshot.__frozen = True
+        return snapshot
+
+    def __repr__(self) -> str:
+        sizes = ", ".join(f"{k}s={len(self.__items[k])}" for k in KINDS)
+        return f"Registry({self.name!r}, {sizes}, parent={self.parent!r})"
+
+
+def _get_builtins_registry() -> Registry:
+    registry = Registry("Builtins")
+    registry.register_module(OUTPUT_MODULE_NAME, OutputModule)
+    return registry.snapshot("Builtins")
+
+
+_builtins_registry = _get_builtins_registry()
+global_registry = Registry("Global", _builtins_registry)
+_current_registry: ContextVar[Registry] = ContextVar(
+    "current_registry", default=global_registry
+)
+
+
+def get_registry() -> Registry:
+    """Get the registry of the current context, which is the global registry by default."""
+    return _current_registry.get()
+
+
+def new_registry(name: str = "Registry") -> Registry:
+    """Create a new scope with only the built-in modules, isolated from the global registry."""
+    return _builtins_registry.child(name)
+
+
+@contextmanager
+def use_registry(registry: Registry) -> Iterator[Registry]:
+    """
+    Use the registry as the current one in the context,
+    so decorators, ModuleRegister and ConverterRegister work on it.
+    """
+    token = _current_registry.set(registry)
+    try:
+        yield registry
+    finally:
+        _current_registry.reset(token)
+
 
 def register_module(obj):
-    """Decorator to register a module with __name__ as name."""
-    ModuleRegister.register(obj.__name__, obj)
+    """Decorator to register a module with __name__ as name in the current registry."""
+    get_registry().register_module(obj.__name__, obj)
     return obj
 
 
 def register_converter(obj):
-    """Decorator to register a converter with __name__ as name."""
-    ConverterRegister.register(obj.__name__, obj)
+    """Decorator to register a converter with __name__ as name in the current registry."""
+    get_registry().register_converter(obj.__name__, obj)
     return obj
 
 
-class ConverterRegister:
-    """Register for converters."""
+def uncached_converter(obj):
+    """
+    Decorator to mark a converter as impure, for example it creates modules or reads
+    global state, so configs converted with it are not cached.
+    """
+    setattr(obj, CONVERTER_CACHE_ATTR, False)
+    return obj
+
 
-    __converters = {}
+class ConverterRegister:
+    """Register for converters of the current registry."""
 
     @staticmethod
     def register(name: str, converter: Callable):
         """Register a converter with a name."""
-        if name in ConverterRegister.__converters:
-            raise ValueError(f"Converter {name} is already registered")
-        ConverterRegister.__converters[name] = converter
-        logger.debug(f"Converter {name} registered successfully")
+        get_registry().register_converter(name, converter)
 
     @staticmethod
     def get(name: str) -> Callable:
         """Get a converter by name."""
-        if name not in ConverterRegister.__converters:
-            raise ValueError(f"Converter {name} is not registered")
-        return ConverterRegister.__converters[name]
+        return get_registry().get_converter(name)
 
     @staticmethod
     def get_env() -> Env:
         """Get the environment of registered converters."""
-        return copy(ConverterRegister.__converters)
+        return dict(get_registry().get_env("converter"))
 
     @staticmethod
     def has(name: str) -> bool:
         """Check if a converter is registered."""
-        return name in ConverterRegister.__converters
+        return get_registry().has_converter(name)
 
     @staticmethod
     def clear():
         """Clear the registered converters."""
-        ConverterRegister.__converters.clear()
-
-
-RegisterModule = Module | CustomModule
+        get_registry().clear_converters()
 
 
 class ModuleRegister:
-    """Register for modules."""
-
-    __builtins: dict[str, RegisterModule] = {OUTPUT_MODULE_NAME: OutputModule}
-    __modules: dict[str, RegisterModule] = copy(__builtins)
+    """Register for modules of the current registry."""
 
     @staticmethod
     def register(name: str, module: RegisterModule):
         """Register a module with a name."""
-        if name in ModuleRegister.__modules:
-            raise ValueError(f"Module {name} is already registered")
-        ModuleRegister.__modules[name] = module
-        logger.debug(f"Module {name} registered successfully")
+        get_registry().register_module(name, module)
 
     @staticmethod
     def get(name: str) -> RegisterModule:
         """Get a module by name."""
-        if name not in ModuleRegister.__modules:
-            raise ValueError(f"Module {name} is not registered")
-        return ModuleRegister.__modules[name]
+        return get_registry().get_module(name)
 
     @staticmethod
     def get_env() -> Env:
         """Get the environment of registered modules."""
-        return copy(ModuleRegister.__modules)
+        return dict(get_registry().get_env("module"))
 
     @staticmethod
     def has(name: str) -> bool:
         """Check if a module is registered."""
-        return name in ModuleRegister.__modules
+        return get_registry().has_module(name)
 
     @staticmethod
     def clear():
-        """Clear the registered modules."""
-        ModuleRegister.__modules = copy(ModuleRegister.__builtins)
+        """Clear the registered modules, built-in modules are kept."""
+        get_registry().clear_modules()
+
+
+def get_builtins_env(with_converters: bool = False) -> Env:
+    """
+    Get python builtins with registered modules (and converters) of the current registry.
+    The result is cached until the registry changes.
+    """
+    return get_registry().get_builtins_env(with_converters)
@@ -1,31 +1,48 @@
-from copy import copy, deepcopy
+from collections import OrderedDict
+from contextlib import nullcontext
+from copy import copy
 from pathlib import Path
-from typing import Any, Callable, Iterable
+import threading
+from types import BuiltinFunctionType, FunctionType, ModuleType
+from typing import Any, Callable, Hashable, Iterable, TypedDict
 
-import yaml
+import torch
+import torch.nn as nn
 
+from ..basic.frozen import freeze, thaw
 from ..basic.types import Env
 from ..basic.utils import (
     get_except_key,
     get_except_keys,
     is_env_conflict,
     merge_envs,
+    to_hashable,
     to_path,
     to_relative_path,
 )
+from ..config.compile import compile_config
+from ..config.loader import ConfigSection, load_configs
 from ..config.module import (
+    bind_input,
     exec_with_env,
     get_exec_env,
     get_imports_env,
     get_input_env,
+    get_param_names,
+    get_var_items,
     get_vars_env,
     parse_converters,
     parse_layers,
 )
+from ..config.types import FinalLayer
+from ..config.utils import DYNAMIC_NAMES, ConstantFolder, get_code_names
+from ..config.utils import get_config_names, get_names
+from ..config.utils import is_constant_string, iter_config_strings
 from ..constants import *
+from ..net.build import DEVICE_CONTEXT
 from ..net.module import PipelineModule
-from ..utils.logger import get_logger
-from .register import ConverterRegister, ModuleRegister
+from ..utils.logger import get_logger, is_enabled, log_lazy
+from .register import Registry, get_registry, use_registry
 from .register_file import register_from_paths
 
 
@@ -33,32 +50,80 @@ EnvFunc = Callable[[Env], Env]
 
 
 def _pipeline_merge_env(func_list: Iterable[EnvFunc], init_env: Env) -> Env:
+    # INFO: init env is shared, it is copied once and every stage updates the copy
     env = copy(init_env)
     for func in func_list:
-        env = merge_envs((env, func(env)))
+        env.update(func(env))
     return env
 
 
+def _get_registered_env(
+    registry: Registry, env: Env, with_converters: bool = False
+) -> Env:
+    """
+    Get the registered layer of env. Registers are read through __builtins__,
+    names shadowed by env are set directly so registers still take precedence over it.
+    """
+    registered = [registry.get_env("module")]
+    if with_converters:
+        registered.append(registry.get_env("converter"))
+    builtins = registry.get_builtins_env(with_converters)
+    shadowed = {k: builtins[k] for k in env if any(k in r for r in registered)}
+    return {"__builtins__": builtins, **shadowed}
+
+
 def get_module(
     name: str,
     args: Iterable[Any] = (),
     kwargs: dict[str, Any] = {},
     config: dict[str, Any] | Path | str | None = None,
+    device: str | torch.device | None = None,
+    registry: Registry | None = None,
 ):
+    """
+    Get a registered module from the registry, which is the current registry by default.
+    If device is given, the module is built on it, which requires torch>=2.0.
+    If device is "meta", the module is built without storage,
+    use utils.weights.materialize_module to load or initialize it.
+    Vars of a module config are only evaluated if layers or post_exec read them,
+    so side effects of unused vars, like random draws or registering modules,
+    do not happen and weights built with a seed may differ from older versions.
+    """
+    if device is not None and not DEVICE_CONTEXT:
+        raise ValueError(f"device requires torch>=2.0, got {torch.__version__}")
+    registry = registry or get_registry()
     if config:
-        register_config(config)
-    module = ModuleRegister.get(name)
-    return module(*args, **kwargs)
+        register_config(config, registry)
+    module = registry.get_module(name)
+    with torch.device(device) if device is not None else nullcontext():
+        return module(*args, **kwargs)
 
 
-def register_config(config: dict[str, Any] | Path | str):
+def register_config(
+    config: dict[str, Any] | Path | str, registry: Registry | None = None
+):
+    """
+    Register the modules of the config to the registry, which is the current registry by default.
+    Files in auto_register are registered to the same registry.
+    Every document of a yaml file is registered as a config, module sections of them
+    may be parsed and validated when the module is first built.
+    """
     logger = get_logger("Register")
+    registry = registry or get_registry()
+    configs = [config]
     if isinstance(config, (str, Path)):
         config = to_path(config)
         logger.info(f"Registering config from {to_relative_path(config)}")
-        config = yaml.safe_load(config.read_text())
+        configs = load_configs(config) or [None]
+    for config in configs:
+        __register_document(config, registry)
+
+
+def __register_document(config: Any, registry: Registry):
+    logger = get_logger("Register")
     if not isinstance(config, dict):
         raise ValueError(f"Invalid config format. Expected dict, got {type(config)}")
+    compile_config(config)
 
     def pipeline(config: dict[str, Any]):
         global_import = config.get(GLOBAL_IMPORTS_KEY, []) + BUILD_IN_IMPORT
@@ -69,59 +134,278 @@ def register_config(config: dict[str, Any] | Path | str):
 
     def register(config: dict[str, Any], env: Env):
         for k, v in config.items():
-            if not isinstance(v, dict):
+            if not isinstance(v, (dict, ConfigSection)):
                 logger.warning(f"{k} can't be recognized as a module, skipping")
                 continue
-            if CONVERTERS_KEY in v:
-                v = __convert_single_config(v, env)
-            __register_single_config(k, v, env)
+            if isinstance(v, dict) and CONVERTERS_KEY in v:
+                v = ConfigConverter(v, env, registry)
+            __register_single_config(k, v, env, registry)
 
-    register_from_paths(Path(p) for p in config.get(AUTO_REGISTER_KEY, []))
+    with use_registry(registry):
+        register_from_paths(Path(p) for p in config.get(AUTO_REGISTER_KEY, []))
     global_env = _pipeline_merge_env(pipeline(config), {})
     excepts = [AUTO_REGISTER_KEY, GLOBAL_IMPORTS_KEY, GLOBAL_EXEC_KEY, GLOBAL_VARS_KEY]
-    register(deepcopy(get_except_keys(config, excepts)), global_env)
+    # INFO: registered configs are frozen instead of copied, so they are shared safely
+    register(freeze(get_except_keys(config, excepts)), global_env)
 
 
 LazyConfig = dict[str, Any] | Callable[..., dict[str, Any]]
 
 
-def __convert_single_config(config: dict[str, Any], env: Env) -> LazyConfig:
-    logger = get_logger("Converter")
+ConverterCacheInfo = TypedDict(
+    "ConverterCacheInfo",
+    {
+        "hits": int,
+        "misses": int,
+        "maxsize": int,
+        "currsize": int,
+    },
+)
 
-    def pipeline(*args: Any, **kwargs: Any):
-        registered_modules = lambda _: ModuleRegister.get_env()
-        registered_converters = lambda _: ConverterRegister.get_env()
+
+class ConfigConverter:
+    """
+    Convert a module config with its converters for the given args.
+    Results are kept in a LRU cache keyed by the args bound to the param names,
+    unless any converter of the call is marked with uncached_converter.
+    The cache is cleared when registered modules or converters are changed.
+    """
+
+    def __init__(
+        self,
+        config: dict[str, Any],
+        env: Env,
+        registry: Registry,
+        maxsize: int = CONVERTER_CACHE_SIZE,
+    ):
+        self.__config = config
+        self.__env = env
+        self.__registry = registry
+        self.__maxsize = maxsize
+        self.__cache: OrderedDict[Hashable, dict[str, Any]] = OrderedDict()
+        self.__hits = self.__misses = 0
+        self.__builtins: Env | None = None
+        # INFO: the same converter may be called by the workers of a parallel build
+        self.__lock = threading.Lock()
+
+    def __get_key(self, args: tuple[Any, ...], kwargs: dict[str, Any]):
+        if self.__maxsize <= 0:
+            return None
+        try:
+            bound = bind_input(self.__config.get(ARGS_KEY, []), args, kwargs)
+            return to_hashable(bound)
+        except TypeError:
+            return None
+
+    def __pipeline(self, args: tuple[Any, ...], kwargs: dict[str, Any]):
+        config = self.__config
+        registry = self.__registry
+        registered = lambda env: _get_registered_env(registry, env, True)
         import_ = lambda _: get_imports_env(config.get(IMPORTS_KEY, []))
         input = lambda env: get_input_env(config.get(ARGS_KEY, []), args, kwargs, env)
-        return [registered_modules, registered_converters, import_, input]
-
-    def convert(*args: Any, **kwargs: Any) -> dict[str, Any]:
-        local_env = _pipeline_merge_env(pipeline(*args, **kwargs), env)
-        converters = parse_converters(config[CONVERTERS_KEY], local_env)
-        converted = get_except_key(config, CONVERTERS_KEY)
-        logger.debug(f"Converting {converted} with converters")
-        logger.debug(f"Config before: {converted}")
+        return [registered, import_, input]
+
+    def __convert(
+        self, args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> tuple[dict[str, Any], bool]:
+        logger = get_logger("Converter")
+        local_env = _pipeline_merge_env(self.__pipeline(args, kwargs), self.__env)
+        converters = parse_converters(self.__config[CONVERTERS_KEY], local_env)
+        # INFO: converters may modify the config in place, so the registered config is
+        # copied once, then each converter owns the config returned by the previous one
+        converted = thaw(get_except_key(self.__config, CONVERTERS_KEY))
+        verbose = is_enabled("Converter", "DEBUG")
+        if verbose:
+            logger.debug(f"Converting {converted} with converters")
+            logger.debug(f"Config before: {converted}")
         for c in converters:
-            converted = c["converter"](deepcopy(converted), *c["args"], **c["kwargs"])
-            logger.debug(f"Config after: {converted}")
+            converted = c["converter"](converted, *c["args"], **c["kwargs"])
+            if verbose:
+                logger.debug(f"Config after: {converted}")
+        cacheable = all(
+            getattr(c["converter"], CONVERTER_CACHE_ATTR, True) for c in converters
+        )
+        return converted, cacheable
+
+    def __call__(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        key = self.__get_key(args, kwargs)
+        # INFO: converters may read registered modules and converters, which can be changed
+        builtins = self.__registry.get_builtins_env(True)
+        with self.__lock:
+            if self.__builtins is not builtins:
+                self.__cache.clear()
+                self.__builtins = builtins
+            if key is not None and key in self.__cache:
+                self.__hits += 1
+                self.__cache.move_to_end(key)
+                return self.__cache[key]
+            self.__misses += 1
+        converted, cacheable = self.__convert(args, kwargs)
+        if key is None or not cacheable or not isinstance(converted, dict):
+            return converted
+        if not _is_shareable(converted):
+            return converted  # INFO: modules and tensors can not be shared
+        # INFO: cached configs are shared between calls, so they are frozen
+        converted = freeze(converted)
+        with self.__lock:
+            if self.__builtins is not builtins:
+                return converted  # INFO: the registry is changed during the conversion
+            self.__cache[key] = converted
+            if len(self.__cache) > self.__maxsize:
+                self.__cache.popitem(last=False)
         return converted
 
-    return convert
-
-
-def __register_single_config(name: str, config: LazyConfig, env: Env):
+    def cache_info(self) -> ConverterCacheInfo:
+        """Get the statistics of the converted config cache."""
+        return {
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "maxsize": self.__maxsize,
+            "currsize": len(self.__cache),
+        }
+
+    def cache_clear(self):
+        """Clear the converted config cache and its statistics."""
+        with self.__lock:
+            self.__cache.clear()
+            self.__hits = self.__misses = 0
+
+
+def _load_section(
+    name: str, section: ConfigSection, env: Env, registry: Registry
+) -> LazyConfig:
+    config = freeze(section.config)
+    if not isinstance(config, dict) or (
+        CONVERTERS_KEY not in config and LAYERS_KEY not in config
+    ):
+        raise ValueError(f"{name} can't be recognized as a module")
+    compile_config({name: config})
+    if CONVERTERS_KEY in config:
+        return ConfigConverter(config, env, registry)
+    return config
+
+
+def __register_single_config(
+    name: str, config: LazyConfig | ConfigSection, env: Env, registry: Registry
+):
     logger = get_logger("Register")
     if isinstance(config, dict) and LAYERS_KEY not in config:
         logger.warning(f"{name} can't be recognized as a module")
         return
-    ModuleRegister.register(name, LazyModule(name, config, env))
+    registry.register_module(name, LazyModule(name, config, env, registry))
+
+
+BuildPlan = TypedDict(
+    "BuildPlan",
+    {
+        "env": Env,
+        "layers": tuple[FinalLayer, ...],
+        "post_exec": str,
+    },
+)
+
+
+def _get_function_values(func: FunctionType) -> list[Any]:
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(cell.cell_contents)
+        except ValueError:  # INFO: the cell is not assigned yet
+            continue
+    names = get_code_names(func.__code__)
+    globals_ = [v for k, v in func.__globals__.items() if k in names]
+    return [*cells, *globals_, func.__defaults__, func.__kwdefaults__]
+
+
+def _is_shareable(obj: Any, seen: set[int] | None = None) -> bool:
+    """
+    Check if the object holds no module or tensor, so it can be shared between instances.
+    Callables are only shareable if they are classes, registered modules, builtins of
+    modules or classes, or plain functions whose closures and read globals are shareable.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return True
+    seen.add(id(obj))
+    if isinstance(obj, (nn.Module, torch.Tensor)):
+        return False
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return all(_is_shareable(i, seen) for i in obj)
+    if isinstance(obj, dict):
+        return all(_is_shareable(v, seen) for v in obj.values())
+    if isinstance(obj, FunctionType):
+        return all(_is_shareable(v, seen) for v in _get_function_values(obj))
+    if isinstance(obj, (type, LazyModule)):
+        return True
+    if isinstance(obj, BuiltinFunctionType):
+        return obj.__self__ is None or isinstance(obj.__self__, (ModuleType, type))
+    # INFO: bound methods, partials and callable objects may hold any state
+    return not callable(obj)
+
+
+def _get_dependent_names(config: dict[str, Any]) -> frozenset[str] | None:
+    """
+    Get the names which may be different between instances of a module config,
+    None if pre_exec reads the environment dynamically, so no expression is constant.
+    """
+    names = {"self", *get_param_names(config[ARGS_KEY])}
+    names |= get_names(config[PRE_EXEC_KEY], "exec")
+    for key in (BUFFERS_KEY, PARAMS_KEY):
+        names |= {k for k, _ in get_var_items(config[key])}
+    if names & DYNAMIC_NAMES:
+        return None
+    for key, value in get_var_items(config[VARS_KEY]):
+        if isinstance(value, str) and not is_constant_string(value, frozenset(names)):
+            names.add(key)
+    return frozenset(names)
+
+
+def _needs_self(config: dict[str, Any]) -> bool:
+    """Check if vars and layers of a module config may read self, pre_exec always can."""
+    if config[PRE_EXEC_KEY]:
+        return True
+    names = get_config_names(config[LAYERS_KEY])
+    for key in (VARS_KEY, BUFFERS_KEY, PARAMS_KEY):
+        names |= get_config_names([v for _, v in get_var_items(config[key])])
+    return bool(names & (DYNAMIC_NAMES | {"self"}))
 
 
 class LazyModule:
-    def __init__(self, name: str, config: LazyConfig, env: Env | None):
+    def __init__(
+        self,
+        name: str,
+        config: LazyConfig | ConfigSection,
+        env: Env | None,
+        registry: Registry | None = None,
+    ):
         self.__name = name
         self.__config = config
         self.__global_env = env or {}
+        self.__registry = registry or get_registry()
+        self.__plans: OrderedDict[Hashable, BuildPlan] = OrderedDict()
+        self.__folder: ConstantFolder | None = None
+        self.__folder_builtins: Env | None = None
+        # INFO: the same module may be built by the workers of a parallel build
+        self.__lock = threading.RLock()
+
+    def __load_section(self):
+        with self.__lock:
+            if isinstance(self.__config, ConfigSection):
+                logger = get_logger("Register")
+                logger.debug(f"{self.__name} is loaded from its config section")
+                config = self.__config
+                self.__config = _load_section(
+                    self.__name, config, self.__global_env, self.__registry
+                )
+
+    def __get_plan_key(self, args: tuple[Any, ...], kwargs: dict[str, Any]):
+        # INFO: converted config may be different with same args, so it is not cached
+        if callable(self.__config):
+            return None
+        try:
+            return to_hashable((args, kwargs))
+        except TypeError:
+            return None
 
     def __prepare_config(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
         config = self.__config
@@ -131,60 +415,161 @@ class LazyModule:
             raise ValueError(msg)
         if LAYERS_KEY not in config:
             raise ValueError(f"Invalid config, missing {LAYERS_KEY} key")
-        key_default_pairs = [
-            (IMPORTS_KEY, []),
-            (ARGS_KEY, []),
-            (PRE_EXEC_KEY, ""),
-            (BUFFERS_KEY, []),
-            (PARAMS_KEY, []),
-            (VARS_KEY, []),
-            (POST_EXEC_KEY, ""),
-        ]
-        for key, default in key_default_pairs:
-            if key not in config:
-                config[key] = default
-        return config
+        defaults = {
+            IMPORTS_KEY: [],
+            ARGS_KEY: [],
+            PRE_EXEC_KEY: "",
+            BUFFERS_KEY: [],
+            PARAMS_KEY: [],
+            VARS_KEY: [],
+            POST_EXEC_KEY: "",
+        }
+        return {**defaults, **config}  # INFO: config may be frozen and shared
+
+    def __get_folder(self, config: dict[str, Any]) -> ConstantFolder | None:
+        # INFO: converted configs may be different for each call, so they are not folded
+        if callable(self.__config):
+            return None
+        with self.__lock:
+            if self.__folder is None:
+                dependent = _get_dependent_names(config)
+                strings = iter_config_strings((config[VARS_KEY], config[LAYERS_KEY]))
+                if dependent is None:
+                    self.__folder = ConstantFolder((), ())
+                else:
+                    self.__folder = ConstantFolder(strings, dependent, _is_shareable)
+                log_lazy(
+                    "Layers",
+                    "DEBUG",
+                    lambda: f"{self.__name} has {len(self.__folder.constants)} "
+                    "constant expressions",
+                )
+            # INFO: folded values may read registered modules, which can be changed
+            builtins = self.__registry.get_builtins_env()
+            if self.__folder_builtins is not builtins:
+                self.__folder.clear()
+                self.__folder_builtins = builtins
+            return self.__folder
+
+    def __get_plan(self, key: Hashable | None) -> BuildPlan | None:
+        if key is None:
+            return None
+        with self.__lock:
+            if key not in self.__plans:
+                return None
+            self.__plans.move_to_end(key)
+            return self.__plans[key]
+
+    def __add_plan(self, key: Hashable, plan: BuildPlan):
+        with self.__lock:
+            self.__plans[key] = plan
+            if len(self.__plans) > BUILD_PLAN_CACHE_SIZE:
+                self.__plans.popitem(last=False)
+
+    def __build_from_plan(self, plan: BuildPlan) -> Any:
+        logger = get_logger("Layers")
+        logger.debug(f"{self.__name} is built with cached build plan")
+        module = PipelineModule()
+        module.init(self.__name, plan["layers"])
+        env = merge_envs((plan["env"], {"self": module}))
+        exec_with_env(plan["post_exec"], env, inplace=True)
+        return module
 
     def get_module(self, *args: Any, **kwargs: Any) -> Any:
+        self.__load_section()
+        key = self.__get_plan_key(args, kwargs)
+        plan = self.__get_plan(key)
+        if plan is not None:
+            return self.__build_from_plan(plan)
         config = self.__prepare_config(*args, **kwargs)
 
         def pipeline_before():
-            registered = lambda _: ModuleRegister.get_env()
+            registered = lambda env: _get_registered_env(self.__registry, env)
             import_ = lambda _: get_imports_env(config[IMPORTS_KEY])
             input = lambda env: get_input_env(config[ARGS_KEY], args, kwargs, env)
             return [registered, import_, input]
 
+        # INFO: functions in vars and layers keep env as globals, and they may be cached
+        # in build plans, so self is only added if it is read, otherwise it is kept alive
+        with_self = _needs_self(config)
+
         def pipeline_init():
             module = PipelineModule()
-            init = lambda _: {"self": module}
-            exec_ = lambda env: get_exec_env(config[PRE_EXEC_KEY], env)
+            init = lambda _: {"self": module} if with_self else {}
+            exec_ = lambda env: get_exec_env(config[PRE_EXEC_KEY], env, inplace=True)
             return module, [init, exec_]
 
-        def pipeline_after():
-            vars = lambda env: get_vars_env(config[VARS_KEY], env)
-            return [vars]
-
-        env = _pipeline_merge_env(pipeline_before(), self.__global_env)
+        # INFO: env is owned by this build, so later stages write into it without copy
+        consts = self.__get_folder(config)
         module, init_pipeline = pipeline_init()
-        env = _pipeline_merge_env(init_pipeline, env)
+        env = _pipeline_merge_env(pipeline_before() + init_pipeline, self.__global_env)
 
-        buffers = get_vars_env(config[BUFFERS_KEY], env)
-        env = merge_envs((env, buffers))
-        params = get_vars_env(config[PARAMS_KEY], env)
+        buffers = get_vars_env(config[BUFFERS_KEY], env, inplace=True)
+        params = get_vars_env(config[PARAMS_KEY], env, inplace=True)
         if is_env_conflict(buffers, params):
             raise ValueError("Buffers and params should not have same key")
-        env = merge_envs((env, buffers, params))
-        env = _pipeline_merge_env(pipeline_after(), env)
-
-        logger = get_logger("Layers")
-        layers_str = "\n".join(str(layer) for layer in config[LAYERS_KEY])
-        logger.debug(f"{self.__name} layers before parsing:\n{layers_str}")
-        layers = parse_layers(config[LAYERS_KEY], env)
-        layers_str = "\n".join(str(layer) for layer in layers)
-        logger.debug(f"{self.__name} layers after parsing:\n{layers_str}")
+        # INFO: only vars read by layers and post_exec are evaluated
+        used = get_config_names(config[LAYERS_KEY])
+        used |= get_names(config[POST_EXEC_KEY], "exec")
+        var_keys = {k for k, _ in get_var_items(config[VARS_KEY])}
+        shadowed = {k: env[k] for k in var_keys if k in env}
+        vars = get_vars_env(config[VARS_KEY], env, used, consts, inplace=True)
+        skipped = var_keys.difference(vars)
+        if skipped:
+            log_lazy(
+                "Module",
+                "INFO",
+                lambda: f"{self.__name} vars {sorted(skipped)} are not used "
+                "by layers and post_exec, so they are not evaluated",
+            )
+
+        layers_str = lambda layers: "\n".join(str(layer) for layer in layers)
+        log_lazy(
+            "Layers",
+            "DEBUG",
+            lambda: f"{self.__name} layers before parsing:\n"
+            + layers_str(config[LAYERS_KEY]),
+        )
+        try:
+            layers = parse_layers(config[LAYERS_KEY], env, consts)
+        except NameError as e:
+            if e.name not in skipped:
+                raise
+            # INFO: the name is built at runtime, so it is evaluated with all vars
+            for k in vars:
+                del env[k]
+            env.update(shadowed)
+            vars = get_vars_env(config[VARS_KEY], env, consts=consts, inplace=True)
+            layers = parse_layers(config[LAYERS_KEY], env, consts)
+        log_lazy(
+            "Layers",
+            "DEBUG",
+            lambda: f"{self.__name} layers after parsing:\n" + layers_str(layers),
+        )
         module.init(self.__name, layers, buffers=buffers, params=params)
-        exec_with_env(config[POST_EXEC_KEY], env)
+        if config[POST_EXEC_KEY]:
+            post_env = env if with_self else merge_envs((env, {"self": module}))
+            exec_with_env(config[POST_EXEC_KEY], post_env, inplace=True)
+
+        # INFO: modules and tensors created by config can not be shared between instances
+        stateless = not (config[PRE_EXEC_KEY] or buffers or params)
+        shareable = lambda: _is_shareable((args, kwargs, vars, layers))
+        if key is not None and stateless and shareable():
+            self.__add_plan(
+                key,
+                {
+                    "env": get_except_key(env, "self"),
+                    "layers": layers,
+                    "post_exec": config[POST_EXEC_KEY],
+                },
+            )
         return module
 
+    def get_converter_cache_info(self) -> ConverterCacheInfo | None:
+        """Get the statistics of the converted config cache, None if it has no converters."""
+        if isinstance(self.__config, ConfigConverter):
+            return self.__config.cache_info()
+        return None
+
     def __call__(self, *args: Any, **kwargs: Any) -> Any:
         return self.get_module(*args, **kwargs)
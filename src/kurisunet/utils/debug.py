@@ -1,8 +1,11 @@
 from functools import wraps
+import json
+from pathlib import Path
 import random
 
 import torch
 
+from ..net.types import ProfileRow
 from ..utils.logger import get_logger
 from .module import get_module_name
 
@@ -31,6 +34,50 @@ def log_shape_hook(module, input, output):
     logger.info(info.format(module_name, input_shape, output_shape))
 
 
+def format_profile(
+    rows: list[ProfileRow], sort_by: str | None = None, limit: int | None = None
+) -> str:
+    """
+    Format profile rows of PipelineModule.get_profile into a flat table.
+    Use `sort_by` with a numeric key of the rows to sort them in descending order.
+    """
+    if sort_by is not None:
+        rows = sorted(rows, key=lambda r: r[sort_by], reverse=True)  # type: ignore
+    rows = rows[:limit]
+    width = max([len(r["path"]) for r in rows] + [4])
+    header = (
+        f"{'Path':<{width}}  {'Module':<16} {'Calls':>6} "
+        f"{'Wall(ms)':>10} {'CPU(ms)':>10} {'Bytes':>12}  Shape"
+    )
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        wall, cpu = r["wall_ns"] / 1e6, r["cpu_ns"] / 1e6
+        lines.append(
+            f"{r['path']:<{width}}  {r['module']:<16} {r['calls']:>6} "
+            f"{wall:>10.3f} {cpu:>10.3f} {r['bytes']:>12}  {r['shape']}"
+        )
+    return "\n".join(lines)
+
+
+def save_chrome_trace(rows: list[ProfileRow], path: str | Path):
+    """Save the last forward pass in profile rows as a Chrome trace JSON file."""
+    events = [
+        {
+            "name": r["path"],
+            "cat": r["module"],
+            "ph": "X",
+            "ts": r["start_ns"] / 1e3,
+            "dur": r["last_wall_ns"] / 1e3,
+            "pid": 0,
+            "tid": 0,
+            "args": {"shape": str(r["shape"]), "calls": r["calls"]},
+        }
+        for r in rows
+        if r["calls"] > 0
+    ]
+    Path(path).write_text(json.dumps({"traceEvents": events}))
+
+
 def reproduce(seed: int = 0, deterministic: bool = True):
     """
     WARN: This decorator has side effects on the entire process.
@@ -1,6 +1,6 @@
 from pathlib import Path
 import sys
-from typing import Literal
+from typing import Any, Callable, Literal
 
 from loguru import logger as base_logger
 
@@ -9,15 +9,87 @@ LOG_NAMES = Literal[
     "KurisuNet", "Register", "Module", "SubModules", "Converter", "Layers", "Utils"
 ]
 default_enabled = ("KurisuNet", "Register", "Module", "Converter", "Utils")
+LEVEL_NOS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
 
-logger = base_logger.bind(name="KurisuNet")
+# INFO: minimal level number of each enabled name, checked before calling loguru
+_enabled_levels = {name: LEVEL_NOS["INFO"] for name in default_enabled}
+_loggers: dict[str, "Logger"] = {}
 
 
-def get_logger(name: LOG_NAMES):
-    """Get a logger with the specified name."""
-    if name == "KurisuNet":
-        return logger
-    return base_logger.bind(name=name)
+def is_enabled(name: LOG_NAMES, level: LOG_LEVELS = "DEBUG") -> bool:
+    """
+    Check if messages of the name and level are enabled.
+    Use it to skip building expensive messages for disabled names.
+    """
+    return LEVEL_NOS[level] >= _enabled_levels.get(name, LEVEL_NOS["CRITICAL"] + 1)
+
+
+class Logger:
+    """
+    Logger of a name, which drops messages of disabled levels before they reach loguru.
+    Enabled messages are passed to loguru with the name in extra.
+    Other methods of loguru like opt, bind, success and exception are called
+    on the bound loguru logger directly.
+    """
+
+    def __init__(self, name: LOG_NAMES):
+        self.name = name
+        self.__bound = base_logger.bind(name=name)
+        # INFO: depth=1 reports the caller of this logger instead of its methods
+        self.__logger = self.__bound.opt(depth=1)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__bound, name)
+
+    def log(self, level: LOG_LEVELS, message: str, *args: Any, **kwargs: Any):
+        if is_enabled(self.name, level):
+            self.__logger.log(level, message, *args, **kwargs)
+
+    def debug(self, message: str, *args: Any, **kwargs: Any):
+        if is_enabled(self.name, "DEBUG"):
+            self.__logger.debug(message, *args, **kwargs)
+
+    def info(self, message: str, *args: Any, **kwargs: Any):
+        if is_enabled(self.name, "INFO"):
+            self.__logger.info(message, *args, **kwargs)
+
+    def warning(self, message: str, *args: Any, **kwargs: Any):
+        if is_enabled(self.name, "WARNING"):
+            self.__logger.warning(message, *args, **kwargs)
+
+    def error(self, message: str, *args: Any, **kwargs: Any):
+        if is_enabled(self.name, "ERROR"):
+            self.__logger.error(message, *args, **kwargs)
+
+    def critical(self, message: str, *args: Any, **kwargs: Any):
+        if is_enabled(self.name, "CRITICAL"):
+            self.__logger.critical(message, *args, **kwargs)
+
+
+def get_logger(name: LOG_NAMES) -> Logger:
+    """Get the cached logger with the specified name."""
+    try:
+        return _loggers[name]
+    except KeyError:
+        return _loggers.setdefault(name, Logger(name))
+
+
+def log_lazy(name: LOG_NAMES, level: LOG_LEVELS, message: Callable[[], str]):
+    """Log the message returned by the callable only if the name and level are enabled."""
+    if is_enabled(name, level):
+        base_logger.bind(name=name).opt(depth=1).log(level, message())
+
+
+def disable_logger():
+    """
+    Disable all names, so every logger returns before formatting or calling loguru.
+    Call set_logger to enable them again.
+    """
+    global _enabled_levels
+    _enabled_levels = {}
+
+
+logger = get_logger("KurisuNet")
 
 
 def set_logger(
@@ -27,9 +99,12 @@ def set_logger(
     log_file_rotation: str | None = None,
 ):
     """
-    Set the logger level and names to display.
+    Set the logger level and names to display, replacing all sinks of loguru.
     Default enabled names: KurisuNet, Register, Module, Converter, Utils
     SubModules and Layers are disabled by default because they are too verbose.
+    Without calling it, messages of default enabled names at INFO level and above
+    are passed to the existing sinks of loguru. Set KURISUNET_LOG_LEVEL to call it
+    with that level on import.
     """
     name_len = max(len(name) for name in LOG_NAMES.__args__)
     level_len = max(len(level) for level in LOG_LEVELS.__args__)
@@ -55,6 +130,8 @@ def set_logger(
     if log_file:
         sources.append(file_source(log_file, log_file_rotation))
 
+    global _enabled_levels
+    _enabled_levels = {name: LEVEL_NOS[level.upper()] for name in names}
     base_logger.remove()
     for source in [{**s, "format": format, "filter": name_filter} for s in sources]:
         base_logger.add(**source)
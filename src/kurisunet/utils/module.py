@@ -46,3 +46,13 @@ def drop_module(module: nn.Module, inplace: bool = False) -> nn.Module:
         filter=lambda m: isinstance(m, PipelineModule),
         inplace=inplace,
     )
+
+
+def fuse_conv_bn(module: nn.Module, inplace: bool = False) -> nn.Module:
+    """Fold BatchNorm into the Conv right before it in all PipelineModule for inference."""
+    return apply_module(
+        module,
+        lambda m: m.fuse_conv_bn(),  # type: ignore
+        filter=lambda m: isinstance(m, PipelineModule),
+        inplace=inplace,
+    )
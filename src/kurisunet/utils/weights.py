@@ -1,10 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import ctypes
+import heapq
+import inspect
+import json
 from pathlib import Path
-from typing import Literal
+import re
+from typing import Any, BinaryIO, Callable, Iterator, Literal, Mapping
 
 from safetensors import safe_open
 from safetensors.torch import save_file
 import torch
+import torch.nn as nn
 
+from ..net.module import PipelineModule
 from ..utils.logger import get_logger
 
 logger = get_logger("Utils")
@@ -25,15 +34,344 @@ def load_state_dict(path: str | Path, device="cpu") -> dict[str, torch.Tensor]:
         return {k: f.get_tensor(k) for k in f.keys()}
 
 
-CONVERT_STRATEGY = Literal["register_order"]
+def save_sharded_state_dict(
+    state_dict: dict[str, torch.Tensor],
+    dir: str | Path,
+    name: str = "model",
+    max_shard_size: int = 2**30,
+    metadata: dict[str, str] | None = None,
+    workers: int = 4,
+) -> Path:
+    """
+    Save state dict to size-bounded safetensors shards and an index file in dir.
+    Tensors are packed in order, a tensor larger than max_shard_size gets its own shard.
+    Return the path of the index file.
+    """
+    shards: list[dict[str, torch.Tensor]] = [{}]
+    shard_size = 0
+    for k, v in state_dict.items():
+        size = v.numel() * v.element_size()
+        if shards[-1] and shard_size + size > max_shard_size:
+            shards.append({})
+            shard_size = 0
+        shards[-1][k] = v
+        shard_size += size
+    dir = Path(dir)
+    dir.mkdir(parents=True, exist_ok=True)
+    num = len(shards)
+    files = [f"{name}-{i + 1:05d}-of-{num:05d}.safetensors" for i in range(num)]
+    save = lambda shard, file: save_file(shard, dir / file, metadata=metadata)
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(save, shards, files))
+    total_size = sum(v.numel() * v.element_size() for v in state_dict.values())
+    index = {
+        "metadata": {**(metadata or {}), "total_size": total_size},
+        "weight_map": {k: f for shard, f in zip(shards, files) for k in shard},
+    }
+    index_path = dir / f"{name}.safetensors.index.json"
+    index_path.write_text(json.dumps(index, indent=2))
+    return index_path
 
 
-def convert_state_dict(
-    old_state_dict: dict[str, torch.Tensor],
-    new_state_dict: dict[str, torch.Tensor],
-    strategy: CONVERT_STRATEGY = "register_order",
+def load_sharded_state_dict(
+    index_path: str | Path,
+    prefix: str | None = None,
+    device: str = "cpu",
+    workers: int = 4,
 ) -> dict[str, torch.Tensor]:
-    """Convert old state dict to new state dict using a conversion strategy."""
+    """
+    Load state dict from safetensors shards of an index file, shards are read in parallel.
+    If prefix is given, only keys of the submodule are loaded with prefix removed,
+    so that they can be loaded into the submodule directly.
+    """
+    index_path = Path(index_path)
+    weight_map: dict[str, str] = json.loads(index_path.read_text())["weight_map"]
+    if prefix is not None:
+        prefix = f"{prefix}."
+        weight_map = {k: f for k, f in weight_map.items() if k.startswith(prefix)}
+    shard_keys: dict[str, list[str]] = {}
+    for k, f in weight_map.items():
+        shard_keys.setdefault(f, []).append(k)
+
+    def load(file: str) -> dict[str, torch.Tensor]:
+        with safe_open(index_path.parent / file, "pt", device=device) as f:
+            return {k: f.get_tensor(k) for k in shard_keys[file]}
+
+    state_dict: dict[str, torch.Tensor] = {}
+    with ThreadPoolExecutor(workers) as executor:
+        for shard in executor.map(load, shard_keys):
+            state_dict.update(shard)
+    state_dict = {k: state_dict[k] for k in weight_map}  # INFO: keep saved order
+    if prefix is not None:
+        state_dict = {k.removeprefix(prefix): v for k, v in state_dict.items()}
+    return state_dict
+
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+# INFO: these dtypes are only mapped by versions of torch which have them
+for name, attr in {
+    "F8_E4M3": "float8_e4m3fn",
+    "F8_E5M2": "float8_e5m2",
+    "F8_E8M0": "float8_e8m0fnu",
+    "U16": "uint16",
+    "U32": "uint32",
+    "U64": "uint64",
+}.items():
+    if hasattr(torch, attr):
+        SAFETENSORS_DTYPES[name] = getattr(torch, attr)
+
+
+SAFETENSORS_NAMES = {v: k for k, v in SAFETENSORS_DTYPES.items()}
+
+
+def _natural_key(key: str) -> tuple[tuple[int, int | str], ...]:
+    return tuple((0, int(p)) if p.isdigit() else (1, p) for p in key.split("."))
+
+
+def _read_into(file: BinaryIO, tensor: torch.Tensor, offset: int, size: int):
+    if tensor.numel() * tensor.element_size() != size:
+        raise ValueError(f"Invalid data size {size} for tensor {tuple(tensor.shape)}")
+    if size == 0:
+        return
+    if tensor.device.type != "cpu" or not tensor.is_contiguous():
+        # INFO: strided views and other devices are read through a contiguous copy
+        temp = torch.empty(tensor.shape, dtype=tensor.dtype)
+        _read_into(file, temp, offset, size)
+        with torch.no_grad():
+            tensor.copy_(temp)
+        return
+    file.seek(offset)
+    buffer = (ctypes.c_char * size).from_address(tensor.data_ptr())
+    if file.readinto(memoryview(buffer).cast("B")) != size:
+        raise ValueError(f"Unexpected end of file {file.name}")
+
+
+# INFO: mmap needs torch>=2.1 and weights_only needs torch>=1.13,
+# older versions load the whole file
+_load_params = inspect.signature(torch.load).parameters
+LOAD_KWARGS = {k: True for k in ("mmap", "weights_only") if k in _load_params}
+
+
+@contextmanager
+def open_weights(
+    path: str | Path,
+) -> Iterator[tuple[dict[str, torch.Tensor], Callable[..., torch.Tensor]]]:
+    """
+    Open a weights file without loading it.
+    Yield meta tensors of the weights in file order and a getter of real tensors,
+    which reads into the given out tensor if possible.
+    Safetensors files are read one tensor at a time, other files are memory-mapped
+    on torch>=2.1 and loaded at once on older versions.
+    Keys of safetensors files are sorted with numeric parts compared as numbers,
+    which is register order for PipelineModule but not for modules in general.
+    """
+    if Path(path).suffix != ".safetensors":
+        state_dict = torch.load(path, map_location="cpu", **LOAD_KWARGS)
+        specs = {k: torch.empty_like(v, device="meta") for k, v in state_dict.items()}
+        yield specs, lambda key, out=None: state_dict[key]
+        return
+    # INFO: safe_open keeps every page it reads mapped until it is closed,
+    # so the data is read straight into a new tensor instead.
+    with open(path, "rb") as file:
+        header_size = int.from_bytes(file.read(8), "little")
+        header = json.loads(file.read(header_size))
+        header.pop("__metadata__", None)
+        specs, offsets = {}, {}
+        for k in sorted(header, key=_natural_key):
+            if (dtype := SAFETENSORS_DTYPES.get(header[k]["dtype"])) is None:
+                raise ValueError(f"Unsupported dtype {header[k]['dtype']} of {k}")
+            specs[k] = torch.empty(header[k]["shape"], dtype=dtype, device="meta")
+            begin, end = header[k]["data_offsets"]
+            offsets[k] = (8 + header_size + begin, end - begin)
+
+        def get_tensor(key: str, out: torch.Tensor | None = None) -> torch.Tensor:
+            spec = specs[key]
+            if out is None or out.shape != spec.shape or out.dtype != spec.dtype:
+                out = torch.empty_like(spec, device="cpu")
+            _read_into(file, out, *offsets[key])
+            return out
+
+        yield specs, get_tensor
+
+
+def _get_file_tensor(f: Any, key: str, like: torch.Tensor) -> torch.Tensor:
+    tensor = f.get_tensor(key).to(like.dtype)
+    if tensor.shape != like.shape:
+        expected, got = tuple(like.shape), tuple(tensor.shape)
+        raise ValueError(f"Shape of {key} should be {expected}, got {got}")
+    return tensor
+
+
+def _check_config_tensors(module: nn.Module, file_keys: set[str]):
+    # INFO: config params and buffers are values of expressions which are not kept,
+    # so they can not be initialized again once they are built on meta device.
+    lost = [
+        f"{prefix}.{n}" if prefix else n
+        for prefix, submodule in module.named_modules()
+        if isinstance(submodule, PipelineModule)
+        for n, t in [*submodule._parameters.items(), *submodule._buffers.items()]
+        if t is not None and t.is_meta
+    ]
+    if lost := [k for k in lost if k not in file_keys]:
+        raise ValueError(
+            f"Params and buffers {lost} of configs are built on meta device "
+            "and not in the file, their values can not be initialized"
+        )
+
+
+def _materialize_tensors(module: nn.Module, f: Any, device: str | torch.device):
+    file_keys = set(f.keys()) if f is not None else set()
+    _check_config_tensors(module, file_keys)
+    materialized: dict[int, torch.Tensor] = {}  # INFO: keep tied tensors tied
+
+    def materialize(key: str, tensor: torch.Tensor, load: bool) -> torch.Tensor:
+        if id(tensor) in materialized:
+            return materialized[id(tensor)]
+        if load:
+            new = _get_file_tensor(f, key, tensor)
+        else:
+            new = torch.empty_like(tensor, device=device)
+        if isinstance(tensor, nn.Parameter):
+            new = nn.Parameter(new, requires_grad=tensor.requires_grad)
+        materialized[id(tensor)] = new
+        return new
+
+    uninitialized = []
+    for prefix, submodule in module.named_modules():
+        prefix = f"{prefix}." if prefix else ""
+        tensors = [*submodule._parameters.items(), *submodule._buffers.items()]
+        tensors = [(n, t) for n, t in tensors if t is not None and t.is_meta]
+        need_init = any(prefix + n not in file_keys for n, _ in tensors)
+        for n, t in tensors:
+            setattr(submodule, n, materialize(prefix + n, t, not need_init))
+        if not need_init:
+            continue
+        # INFO: initializers reset all tensors of the module, so load the file after them
+        if hasattr(submodule, "reset_parameters"):
+            submodule.reset_parameters()
+        else:
+            uninitialized.append(prefix.rstrip(".") or type(module).__name__)
+        with torch.no_grad():
+            for n, t in tensors:
+                if prefix + n in file_keys:
+                    tensor = _get_file_tensor(f, prefix + n, t)
+                    getattr(submodule, n).copy_(tensor)
+    if uninitialized:
+        logger.warning(f"Modules {uninitialized} are materialized without initializer")
+
+
+def materialize_module(
+    module: nn.Module,
+    path: str | Path | None = None,
+    device: str | torch.device = "cpu",
+    strict: bool = True,
+) -> nn.Module:
+    """
+    Materialize meta tensors of a module built on meta device in place.
+    Tensors in the safetensors file are loaded one by one without extra copy,
+    others are initialized by reset_parameters of their modules.
+    Initializations in post_exec of configs are not replayed, and params and buffers
+    of configs are not initialized again, so they should be in the file.
+    """
+    if path is None:
+        _materialize_tensors(module, None, device)
+        return module
+    with safe_open(path, "pt", device=str(device)) as f:
+        file_keys, state_keys = set(f.keys()), set(module.state_dict().keys())
+        if strict and file_keys != state_keys:
+            missing, unexpected = state_keys - file_keys, file_keys - state_keys
+            raise ValueError(
+                f"Keys mismatch with {path}, "
+                f"missing: {sorted(missing)}, unexpected: {sorted(unexpected)}"
+            )
+        _materialize_tensors(module, f, device)
+    return module
+
+
+CONVERT_STRATEGY = Literal["register_order", "shape", "fuzzy"]
+
+
+def _signature(tensor: torch.Tensor) -> tuple[tuple[int, ...], torch.dtype]:
+    return tuple(tensor.shape), tensor.dtype
+
+
+def _group_by_signature(
+    state_dict: Mapping[str, torch.Tensor],
+) -> dict[tuple[tuple[int, ...], torch.dtype], list[str]]:
+    groups: dict[tuple[tuple[int, ...], torch.dtype], list[str]] = {}
+    for k, v in state_dict.items():
+        groups.setdefault(_signature(v), []).append(k)
+    return groups
+
+
+def _key_tokens(key: str) -> frozenset[str]:
+    return frozenset(re.split(r"[._]", key))
+
+
+def _fuzzy_match(
+    old_keys: list[str], new_keys: list[str], candidates: int = 8, window: int = 32
+) -> dict[str, str]:
+    # INFO: greedy matching of the best candidates by token similarity,
+    # ties are broken by relative position and the rest are zipped in order.
+    position = lambda i, keys: i / max(len(keys) - 1, 1)
+    new_tokens = [_key_tokens(k) for k in new_keys]
+    # INFO: only new keys near the relative position or sharing a rare token
+    # are scored, tokens like weight are in every key and would score all of them.
+    index: dict[str, list[int]] = {}
+    for j, tokens in enumerate(new_tokens):
+        for token in tokens:
+            index.setdefault(token, []).append(j)
+
+    def score(i: int, o: frozenset[str], j: int) -> tuple[float, float, int, int]:
+        similarity = len(o & new_tokens[j]) / len(o | new_tokens[j])
+        distance = abs(position(i, old_keys) - position(j, new_keys))
+        return -similarity, distance, i, j
+
+    scores = []
+    for i, old_key in enumerate(old_keys):
+        o = _key_tokens(old_key)
+        near = round(position(i, old_keys) * (len(new_keys) - 1))
+        near_range = range(max(near - window, 0), min(near + window + 1, len(new_keys)))
+        js = set(near_range)
+        for token in o:
+            if len(posting := index.get(token, [])) <= window:
+                js.update(posting)
+        row = (score(i, o, j) for j in js)
+        scores.extend(heapq.nsmallest(candidates, row))
+    key_map, used_old, used_new = {}, set(), set()
+    for _, _, i, j in sorted(scores):
+        if i not in used_old and j not in used_new:
+            key_map[old_keys[i]] = new_keys[j]
+            used_old.add(i)
+            used_new.add(j)
+    rest_old = [k for i, k in enumerate(old_keys) if i not in used_old]
+    rest_new = [k for j, k in enumerate(new_keys) if j not in used_new]
+    key_map.update(zip(rest_old, rest_new))
+    return key_map
+
+
+def get_key_map(
+    old_state_dict: Mapping[str, torch.Tensor],
+    new_state_dict: Mapping[str, torch.Tensor],
+    strategy: CONVERT_STRATEGY = "register_order",
+) -> dict[str, str]:
+    """
+    Map keys of old state dict to keys of new state dict using a conversion strategy.
+    register_order: zip keys in order, the state dicts must have the same length.
+    shape: zip keys with same shape and dtype in order, extra keys are unmatched.
+    fuzzy: match keys with same shape and dtype by similarity of key paths.
+    """
 
     def register_order_key_map(old_state_dict, new_state_dict) -> dict[str, str]:
         if len(old_state_dict) != len(new_state_dict):
@@ -43,6 +381,146 @@ def convert_state_dict(
         key_map = {o: n for o, n in zip(old_keys, new_keys)}
         return key_map
 
+    def signature_key_map(old_state_dict, new_state_dict, match) -> dict[str, str]:
+        new_groups = _group_by_signature(new_state_dict)
+        key_map = {}
+        for signature, old_keys in _group_by_signature(old_state_dict).items():
+            key_map.update(match(old_keys, new_groups.get(signature, [])))
+        # INFO: keep the order of old state dict
+        return {k: key_map[k] for k in old_state_dict if k in key_map}
+
     if strategy == "register_order":
         key_map = register_order_key_map(old_state_dict, new_state_dict)
-    return {key_map[k]: v for k, v in old_state_dict.items()}
+    elif strategy == "shape":
+        zip_match = lambda o, n: dict(zip(o, n))
+        key_map = signature_key_map(old_state_dict, new_state_dict, zip_match)
+    elif strategy == "fuzzy":
+        key_map = signature_key_map(old_state_dict, new_state_dict, _fuzzy_match)
+    else:
+        raise ValueError(f"Unknown conversion strategy {strategy!r}")
+    report_key_map(key_map, old_state_dict, new_state_dict)
+    return key_map
+
+
+def report_key_map(
+    key_map: Mapping[str, str],
+    old_state_dict: Mapping[str, Any],
+    new_state_dict: Mapping[str, Any],
+) -> tuple[list[str], list[str]]:
+    """Log the mapping result and return unmatched old keys and new keys."""
+    mapped = set(key_map.values())
+    unmatched_old = [k for k in old_state_dict if k not in key_map]
+    unmatched_new = [k for k in new_state_dict if k not in mapped]
+    logger.debug(f"{len(key_map)} of {len(new_state_dict)} tensors are mapped")
+    if unmatched_old:
+        logger.warning(f"Unmatched tensors in old state dict: {unmatched_old}")
+    if unmatched_new:
+        logger.warning(f"Unmatched tensors in new state dict: {unmatched_new}")
+    return unmatched_old, unmatched_new
+
+
+def convert_state_dict(
+    old_state_dict: dict[str, torch.Tensor],
+    new_state_dict: dict[str, torch.Tensor],
+    strategy: CONVERT_STRATEGY = "register_order",
+) -> dict[str, torch.Tensor]:
+    """
+    Convert old state dict to new state dict using a conversion strategy.
+    Unmatched tensors of old state dict are left out.
+    """
+    key_map = get_key_map(old_state_dict, new_state_dict, strategy)
+    return {key_map[k]: v for k, v in old_state_dict.items() if k in key_map}
+
+
+def convert_weights_file(
+    old_path: str | Path,
+    new_path: str | Path,
+    new_state_dict: Mapping[str, torch.Tensor],
+    strategy: CONVERT_STRATEGY = "register_order",
+    metadata: dict[str, str] | None = None,
+):
+    """
+    Convert a weights file to a safetensors file with keys of new state dict.
+    Tensors are mapped, read and written one at a time, so new state dict
+    can be the state dict of a module built on meta device.
+    """
+    with open_weights(old_path) as (specs, get_tensor):
+        key_map = get_key_map(specs, new_state_dict, strategy)
+        header: dict[str, Any] = {"__metadata__": metadata} if metadata else {}
+        offset = 0
+        for old_key, new_key in key_map.items():
+            spec = specs[old_key]
+            size = spec.numel() * spec.element_size()
+            if (dtype := SAFETENSORS_NAMES.get(spec.dtype)) is None:
+                raise ValueError(f"Unsupported dtype {spec.dtype} of {old_key}")
+            header[new_key] = {
+                "dtype": dtype,
+                "shape": list(spec.shape),
+                "data_offsets": [offset, offset + size],
+            }
+            offset += size
+        header_bytes = json.dumps(header, separators=(",", ":")).encode()
+        header_bytes += b" " * (-len(header_bytes) % 8)  # INFO: align data to 8 bytes
+        with open(new_path, "wb") as file:
+            file.write(len(header_bytes).to_bytes(8, "little"))
+            file.write(header_bytes)
+            for old_key in key_map:
+                tensor = get_tensor(old_key).contiguous()
+                size = tensor.numel() * tensor.element_size()
+                if size > 0:
+                    buffer = (ctypes.c_char * size).from_address(tensor.data_ptr())
+                    file.write(memoryview(buffer).cast("B"))
+
+
+def load_weights_into(
+    module: nn.Module,
+    path: str | Path,
+    strategy: CONVERT_STRATEGY | None = None,
+    strict: bool = True,
+    assign: bool = False,
+) -> nn.Module:
+    """
+    Load weights from a file into the module one tensor at a time.
+    If strategy is given, keys of the file are mapped like convert_state_dict.
+    If assign is True, loaded tensors replace tensors of the module instead of
+    being copied into them, which also materializes modules on meta device.
+    """
+    targets = module.state_dict(keep_vars=True)
+    assigned: dict[int, torch.Tensor] = {}  # INFO: keep tied tensors tied
+
+    def assign_tensor(key: str, tensor: torch.Tensor, target: torch.Tensor):
+        if id(target) not in assigned:
+            tensor = tensor.to(target.dtype)
+            if isinstance(target, nn.Parameter):
+                tensor = nn.Parameter(tensor, requires_grad=target.requires_grad)
+            assigned[id(target)] = tensor
+        prefix, _, name = key.rpartition(".")
+        setattr(module.get_submodule(prefix), name, assigned[id(target)])
+
+    with open_weights(path) as (specs, get_tensor):
+        if strategy == "register_order" and Path(path).suffix == ".safetensors":
+            logger.warning(f"Keys of {path} are sorted, register order may not match")
+        key_map = get_key_map(specs, targets, strategy) if strategy else None
+        key_map = key_map if key_map is not None else {k: k for k in specs}
+        missing = set(targets).difference(key_map.values())
+        unexpected = [k for k, v in key_map.items() if v not in targets]
+        if strict and (missing or unexpected):
+            raise ValueError(
+                f"Keys mismatch with {path}, "
+                f"missing: {sorted(missing)}, unexpected: {sorted(unexpected)}"
+            )
+        for old_key, new_key in key_map.items():
+            # INFO: drop references to replaced tensors so they can be freed
+            if (target := targets.pop(new_key, None)) is None:
+                continue
+            if specs[old_key].shape != target.shape:
+                expected, got = tuple(target.shape), tuple(specs[old_key].shape)
+                raise ValueError(f"Shape of {new_key} should be {expected}, got {got}")
+            if assign:
+                assign_tensor(new_key, get_tensor(old_key), target)
+                continue
+            tensor = get_tensor(old_key, out=target.detach())
+            if tensor.data_ptr() != target.data_ptr():
+                with torch.no_grad():
+                    target.copy_(tensor)
+    return module
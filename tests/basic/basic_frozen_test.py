@@ -0,0 +1,61 @@
+from copy import deepcopy
+import pickle
+import unittest
+
+from kurisunet.basic.frozen import FrozenDict, FrozenList, freeze, thaw
+
+
+class TestFrozen(unittest.TestCase):
+    def test_freeze(self):
+        config = {"a": [1, {"b": [2]}], "c": (3, [4])}
+        frozen = freeze(config)
+        self.assertEqual(frozen, config)
+        self.assertIsInstance(frozen, FrozenDict)
+        self.assertIsInstance(frozen["a"], FrozenList)
+        self.assertIsInstance(frozen["a"][1], FrozenDict)
+        self.assertIsInstance(frozen["c"][1], FrozenList)
+        self.assertIs(freeze(frozen), frozen)
+        config["a"].append(5)
+        self.assertEqual(frozen["a"], [1, {"b": [2]}])
+
+    def test_read_only(self):
+        frozen = freeze({"a": [1], "b": {"c": 2}})
+        modify = [
+            lambda: frozen.__setitem__("a", 1),
+            lambda: frozen.pop("a"),
+            lambda: frozen.update(a=1),
+            lambda: frozen["a"].append(2),
+            lambda: frozen["a"].__setitem__(0, 2),
+            lambda: frozen["b"].setdefault("d", 3),
+        ]
+        for func in modify:
+            with self.assertRaises(TypeError):
+                func()
+
+    def test_merge(self):
+        frozen = freeze({"a": [1], "b": 2})
+        merged = frozen.merge({"b": 3})
+        self.assertIsInstance(merged, FrozenDict)
+        self.assertEqual(merged, {"a": [1], "b": 3})
+        self.assertIs(merged["a"], frozen["a"])
+        self.assertEqual(frozen["b"], 2)
+
+    def test_thaw(self):
+        frozen = freeze({"a": [1, {"b": [2]}], "c": (3, [4])})
+        thawed = thaw(frozen)
+        self.assertEqual(thawed, frozen)
+        self.assertIs(type(thawed["a"][1]), dict)
+        self.assertIs(type(thawed["c"][1]), list)
+        thawed["a"][1]["b"].append(5)
+        self.assertEqual(frozen["a"][1]["b"], [2])
+
+    def test_copy(self):
+        frozen = freeze({"a": [1, {"b": [2]}]})
+        for copied in (deepcopy(frozen), pickle.loads(pickle.dumps(frozen))):
+            self.assertEqual(copied, frozen)
+            self.assertIsInstance(copied["a"][1], FrozenDict)
+            self.assertIsNot(copied["a"], frozen["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
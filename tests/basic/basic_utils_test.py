@@ -9,6 +9,7 @@ from kurisunet.basic.utils import (
     is_env_conflict,
     is_list_tuple_of,
     merge_envs,
+    to_hashable,
     to_path,
     to_relative_path,
 )
@@ -56,6 +57,16 @@ class TestUtils(unittest.TestCase):
         merged_env = merge_envs([old_env, new_env])
         self.assertEqual(merged_env, {"a": 1, "b": 3, "c": 4})
 
+    def test_to_hashable(self):
+        self.assertEqual(to_hashable([1, {"a": (2,)}]), to_hashable([1, {"a": (2,)}]))
+        self.assertNotEqual(to_hashable([1, 2]), to_hashable((1, 2)))
+        self.assertNotEqual(to_hashable(1), to_hashable(True))
+        self.assertEqual(
+            hash(to_hashable({"a": [1, {2}]})), hash(to_hashable({"a": [1, {2}]}))
+        )
+        with self.assertRaises(TypeError):
+            to_hashable(bytearray(b"1"))
+
     def test_to_path(self):
         self.assertEqual(to_path("test.txt"), Path("test.txt"))
         self.assertEqual(to_path(Path("test.txt")), Path("test.txt"))
@@ -0,0 +1,60 @@
+import unittest
+
+from kurisunet.config.compile import compile_config
+from kurisunet.config.utils import compile_string
+from kurisunet.constants import *
+
+
+class TestCompileConfig(unittest.TestCase):
+    def test_compile_config(self):
+        config = {
+            GLOBAL_IMPORTS_KEY: ["from math import prod"],
+            GLOBAL_EXEC_KEY: "def double(x):\n    return x * 2",
+            GLOBAL_VARS_KEY: [{"scale": "double(2)"}],
+            "Test": {
+                ARGS_KEY: ["c1", {"c2": "c1 * scale"}],
+                VARS_KEY: [{"hid": "prod([c1, c2])"}, {"name": STR_PREFIX + "a b"}],
+                LAYERS_KEY: [
+                    [-1, "nn.Linear", ["c1", "hid"], {"bias": "c2 > 1"}],
+                    "[[-1, nn.ReLU] for _ in range(2)]",
+                ],
+            },
+        }
+        compile_config(config)
+        compile_string.cache_clear()
+        compile_config(config)
+        self.assertGreater(compile_string.cache_info().currsize, 0)
+
+    def test_compile_config_invalid(self):
+        invalid = [
+            ({GLOBAL_EXEC_KEY: "def f("}, GLOBAL_EXEC_KEY),
+            ({GLOBAL_VARS_KEY: [{"a": "1 +"}]}, f"{GLOBAL_VARS_KEY}.0.a"),
+            ({"Test": {IMPORTS_KEY: ["import"]}}, f"Test.{IMPORTS_KEY}.0"),
+            ({"Test": {ARGS_KEY: ["a", {"b": "a +"}]}}, f"Test.{ARGS_KEY}.1.b"),
+            ({"Test": {LAYERS_KEY: [[-1, "nn.("]]}}, f"Test.{LAYERS_KEY}.0.1"),
+            ({"Test": {LAYERS_KEY: [[-1, "f", ["1 +"]]]}}, f"Test.{LAYERS_KEY}.0.2.0"),
+            (
+                {"Test": {LAYERS_KEY: [[-1, "f", {"a": "]"}]]}},
+                f"Test.{LAYERS_KEY}.0.2.a",
+            ),
+            ({"Test": {POST_EXEC_KEY: "if"}}, f"Test.{POST_EXEC_KEY}"),
+        ]
+        for config, path in invalid:
+            with self.assertRaisesRegex(ValueError, path):
+                compile_config(config)
+
+    def test_compile_config_converters(self):
+        config = {
+            "Test": {
+                CONVERTERS_KEY: [["converter", ["1"]]],
+                LAYERS_KEY: [[-1, "<placeholder>"]],
+            }
+        }
+        compile_config(config)
+        config["Test"][CONVERTERS_KEY] = [["converter", ["1 +"]]]
+        with self.assertRaisesRegex(ValueError, f"Test.{CONVERTERS_KEY}.0.1.0"):
+            compile_config(config)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import marshal
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from kurisunet.config import loader
+from kurisunet.config.compile import CompiledConfig, compile_config
+from kurisunet.config.loader import ConfigSection, get_config_cache, load_configs
+from kurisunet.config.loader import set_config_cache
+
+CONFIG = """
+global_imports:
+  - from math import prod
+Test:
+  imports:
+    - from itertools import pairwise
+  layers:
+    - [-1, nn.Linear, ["prod([2, 3])", 4]]
+"""
+
+
+class TestLoadConfig(unittest.TestCase):
+    def setUp(self):
+        self.old_cache = get_config_cache()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = Path(self.tmp.name) / "cache"
+        self.path = Path(self.tmp.name) / "net.yaml"
+        self.path.write_text(CONFIG)
+        set_config_cache(self.cache)
+
+    def tearDown(self):
+        set_config_cache(self.old_cache)
+        self.tmp.cleanup()
+
+    def test_load_config_cache(self):
+        with patch.object(loader, "_load_yaml", wraps=loader._load_yaml) as mock:
+            config = load_configs(self.path)
+            self.assertEqual(len(list(self.cache.glob("*.cache"))), 1)
+            self.assertEqual(load_configs(self.path), config)
+            self.assertEqual(mock.call_count, 1)
+
+            os.utime(self.path, ns=(0, 0))  # INFO: touched but not changed
+            self.assertEqual(load_configs(self.path), config)
+            self.assertEqual(mock.call_count, 1)
+
+            self.path.write_text(CONFIG.replace("4]", "5]"))
+            changed = load_configs(self.path)
+            self.assertEqual(mock.call_count, 2)
+        self.assertEqual(changed[0]["Test"]["layers"][0][2][1], 5)
+
+    def test_load_config_invalid_cache(self):
+        config = load_configs(self.path)
+        for file in self.cache.glob("*.cache"):
+            file.write_bytes(b"invalid")
+        self.assertEqual(load_configs(self.path), config)
+        for file in self.cache.glob("*.cache"):  # INFO: not signed with the key
+            file.write_bytes(bytes(32) + marshal.dumps({"config": []}))
+        self.assertEqual(load_configs(self.path), config)
+
+    def assert_cache_disabled(self):
+        with patch.object(loader.logger, "warning") as mock:
+            config = load_configs(self.path, lazy=False)
+        mock.assert_called_once()
+        self.assertIsNone(get_config_cache())
+        self.assertEqual(config[0]["Test"]["layers"][0][1], "nn.Linear")
+
+    def test_load_config_key_size(self):
+        self.cache.mkdir(mode=0o700)
+        (self.cache / loader.CACHE_KEY_FILE).write_bytes(b"")  # INFO: crash after create
+        self.assert_cache_disabled()
+
+    @unittest.skipIf(not hasattr(os, "getuid"), "no owner and mode bits")
+    def test_load_config_key_owner(self):
+        load_configs(self.path)
+        with patch.object(os, "getuid", return_value=os.getuid() + 1):
+            self.assert_cache_disabled()
+
+    @unittest.skipIf(not hasattr(os, "getuid"), "no owner and mode bits")
+    def test_load_config_key_mode(self):
+        load_configs(self.path)
+        (self.cache / loader.CACHE_KEY_FILE).chmod(0o644)
+        self.assert_cache_disabled()
+
+    @unittest.skipIf(not hasattr(os, "getuid"), "no owner and mode bits")
+    def test_load_config_dir_mode(self):
+        self.cache.mkdir(mode=0o700)
+        self.cache.chmod(0o755)
+        self.assert_cache_disabled()
+        self.assertFalse((self.cache / loader.CACHE_KEY_FILE).exists())
+        self.assertEqual(list(self.cache.glob("*.cache")), [])
+
+    def test_load_config_compiled(self):
+        load_configs(self.path)
+        config = load_configs(self.path)[0]
+        self.assertIsInstance(config, CompiledConfig)
+        self.assertEqual(compile_config(config), {})
+
+    def test_load_config_without_cache(self):
+        set_config_cache(None)
+        config = load_configs(self.path, lazy=False)[0]
+        self.assertEqual(config["Test"]["layers"][0][1], "nn.Linear")
+        self.assertFalse(self.cache.exists())
+
+
+class TestLoadLazyConfig(unittest.TestCase):
+    def setUp(self):
+        self.old_cache = get_config_cache()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "net.yaml"
+        set_config_cache(None)
+
+    def tearDown(self):
+        set_config_cache(self.old_cache)
+        self.tmp.cleanup()
+
+    def test_lazy_sections(self):
+        self.path.write_text(CONFIG)
+        config = load_configs(self.path)[0]
+        self.assertEqual(config["global_imports"], ["from math import prod"])
+        self.assertIsInstance(config["Test"], ConfigSection)
+        expected = load_configs(self.path, lazy=False)[0]["Test"]
+        self.assertEqual(config["Test"].config, expected)
+
+    def test_multi_documents(self):
+        text = CONFIG + "---\n# comment\nOther:\n  layers:\n  - [-1, nn.ReLU]\n---\n"
+        self.path.write_text(text)
+        configs = load_configs(self.path)
+        self.assertEqual(len(configs), 2)
+        self.assertEqual(configs[1]["Other"].config, {"layers": [[-1, "nn.ReLU"]]})
+        self.assertEqual(len(load_configs(self.path, lazy=False)), 2)
+
+    def test_anchor_between_sections(self):
+        text = "Base:\n  layers: &layers\n    - [-1, nn.ReLU]\nTest:\n  layers: *layers\n"
+        self.path.write_text(text)
+        config = load_configs(self.path)[0]
+        self.assertEqual(config, load_configs(self.path, lazy=False)[0])
+        self.assertNotIsInstance(config["Test"], ConfigSection)
+
+    def test_non_mapping_sections(self):
+        text = "List:\n  - 1\nNone:\nText:\n  text\nTest:\n  layers: []\n"
+        self.path.write_text(text)
+        config = load_configs(self.path)[0]
+        self.assertEqual(config["List"], [1])
+        self.assertEqual((config["None"], config["Text"]), (None, "text"))
+        self.assertIsInstance(config["Test"], ConfigSection)
+
+    def test_fallback(self):
+        for text in ["{Test: {layers: []}}", "%YAML 1.2\n---\nTest: {layers: []}"]:
+            self.path.write_text(text)
+            self.assertEqual(load_configs(self.path), [{"Test": {"layers": []}}])
+
+
+if __name__ == "__main__":
+    unittest.main()
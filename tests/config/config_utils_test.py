@@ -1,6 +1,7 @@
 import unittest
 
-from kurisunet.config.utils import eval_string
+from kurisunet.config.utils import compile_string, eval_string, get_config_names
+from kurisunet.config.utils import ConstantFolder, get_names, is_constant_string
 from kurisunet.constants import STR_PREFIX
 
 
@@ -11,6 +12,48 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(eval_string(string, env), 3)
         string = STR_PREFIX + string
         self.assertEqual(eval_string(string, env), "a + b")
+        self.assertEqual(eval_string(" a + b", env), 3)
+
+    def test_compile_string(self):
+        code = compile_string("a + b")
+        self.assertIs(compile_string("a + b"), code)
+        self.assertEqual(eval(code, {"a": 1, "b": 2}), 3)
+        env = {}
+        exec(compile_string("a = 1\nb = a + 1", "exec"), env)
+        self.assertEqual(env["b"], 2)
+        with self.assertRaises(SyntaxError):
+            compile_string("a = 1")
+
+    def test_get_names(self):
+        self.assertEqual(get_names("a + b.c"), {"a", "b", "c"})
+        self.assertEqual(get_names("lambda x: x + a"), {"a"})
+        self.assertEqual(get_names("f('b + c')"), {"f", "b", "c"})
+        self.assertEqual(get_names("x = a", "exec"), {"x", "a"})
+        self.assertEqual(get_names("a +"), frozenset())
+
+    def test_get_config_names(self):
+        config = [[-1, "nn.Linear", ["a", 1]], {"k": "b"}]
+        self.assertEqual(get_config_names(config), {"nn", "Linear", "a", "b"})
+
+    def test_is_constant_string(self):
+        dependent = frozenset({"dim"})
+        for string in ["(3, 3)", "lambda *x: cat(x, 1)", STR_PREFIX + "dim", "a.b"]:
+            self.assertTrue(is_constant_string(string, dependent), string)
+        for string in ["dim", "f(1)", "[1, 2]", "eval('1')", "lambda: dim", "a +"]:
+            self.assertFalse(is_constant_string(string, dependent), string)
+        for string in ["a + b", "a[1:]", "-a", "a == b"]:  # INFO: may be new lists
+            self.assertFalse(is_constant_string(string, dependent), string)
+
+    def test_constant_folder(self):
+        consts = ConstantFolder(["lambda x: x + a", "a + dim"], {"dim"})
+        self.assertEqual(consts.constants, {"lambda x: x + a"})
+        env = {"a": 1, "dim": 2}
+        func = eval_string("lambda x: x + a", env, consts)
+        self.assertIs(eval_string("lambda x: x + a", {"a": 1, "dim": 3}, consts), func)
+        self.assertNotIn("dim", func.__globals__)
+        self.assertEqual(eval_string("a + dim", env, consts), 3)
+        consts.clear()
+        self.assertIsNot(eval_string("lambda x: x + a", env, consts), func)
 
 
 if __name__ == "__main__":
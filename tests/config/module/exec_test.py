@@ -40,6 +40,13 @@ class TestGetExecEnv(unittest.TestCase):
         self.assertEqual(local_env, {"a": 2})
         self.assertEqual(env, {"a": 1})
 
+    def test_inplace_exec_env(self):
+        env = {"a": 1}
+        exec_ = "global c\nc = a\nb = a + 1"
+        local_env = get_exec_env(exec_, env, inplace=True)
+        self.assertEqual(local_env, {"b": 2})
+        self.assertEqual(env["c"], 1)
+
     def test_invalid_exec_env(self):
         env = {"a": 1}
         exec_ = "b = a + '1'"
@@ -64,6 +71,11 @@ class TestExecWithEnv(unittest.TestCase):
         exec_with_env(exec_, env)
         self.assertEqual(env, {"a": 1})
 
+    def test_exec_with_inplace_env(self):
+        env = {"a": 1}
+        exec_with_env("global a\na = a + 1", env, inplace=True)
+        self.assertEqual(env["a"], 2)
+
     def test_exec_with_invalid_env(self):
         env = {"a": 1}
         exec_ = "b = a + '1'"
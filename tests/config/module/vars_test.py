@@ -4,6 +4,7 @@ from kurisunet.config.module.vars import (
     _check_vars,
     _format_vars,
     _get_vars_env,
+    get_var_items,
     get_vars_env,
 )
 from kurisunet.constants import STR_PREFIX
@@ -84,6 +85,26 @@ class TestGetVarsEnv(unittest.TestCase):
         self.assertEqual(_get_vars_env(vars, env), expected)
         self.assertEqual(get_vars_env(vars, env), expected)
 
+    def test_inplace_env(self):
+        vars = [("a", 1), ("c", "b + a")]
+        env = {"b": 3}
+        self.assertEqual(get_vars_env(vars, env, inplace=True), {"a": 1, "c": 4})
+        self.assertEqual((env["a"], env["c"]), (1, 4))
+
+    def test_used_vars(self):
+        vars = [("a", 1), ("b", "a + 1"), ("c", "undefined"), ("d", "b * 2")]
+        self.assertEqual(get_vars_env(vars, used={"d"}), {"a": 1, "b": 2, "d": 4})
+        self.assertEqual(get_vars_env(vars, used=set()), {})
+        with self.assertRaises(NameError):
+            get_vars_env(vars, used={"c"})
+
+    def test_used_vars_dynamic(self):
+        vars = [("a", 1), ("b", "eval('a')"), ("c", "2")]
+        self.assertEqual(get_vars_env(vars, used={"b"}), {"a": 1, "b": 1, "c": 2})
+
+    def test_get_var_items(self):
+        self.assertEqual(get_var_items([{"a": 1}, ("b", 2)]), (("a", 1), ("b", 2)))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,52 @@
+import os
+import time
+import unittest
+
+import torch.nn as nn
+
+from kurisunet.config.types import FinalLayer
+from kurisunet.constants import ALL_FROM
+from kurisunet.net.module import PipelineModule
+from kurisunet.net.utils import get_same_indexes
+
+
+def get_layers(num: int, same_every: int = 10) -> tuple[FinalLayer, ...]:
+    same = nn.ReLU()
+    same_module = lambda *a, **k: same
+    return tuple(
+        {
+            "from": ((-1, ALL_FROM),),
+            "module": same_module if i % same_every == 0 else nn.Identity,
+            "args": (),
+            "kwargs": {},
+        }
+        for i in range(num)
+    )
+
+
+def timeit(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+@unittest.skipUnless(os.environ.get("KURISUNET_BENCHMARK"), "KURISUNET_BENCHMARK unset")
+class TestInitBenchmark(unittest.TestCase):
+    def test_get_same_indexes(self):
+        modules = {n: [l["module"]() for l in get_layers(n)] for n in (1000, 10000)}
+        times = {n: timeit(lambda: get_same_indexes(m)) for n, m in modules.items()}
+        print(f"\nget_same_indexes: {times}")
+        self.assertLess(times[10000], times[1000] * 30)
+
+    def test_init(self):
+        layers = {n: get_layers(n) for n in (1000, 10000)}
+        times = {
+            n: timeit(lambda: PipelineModule().init("Bench", l))
+            for n, l in layers.items()
+        }
+        print(f"\nPipelineModule.init: {times}")
+        self.assertLess(times[10000], times[1000] * 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
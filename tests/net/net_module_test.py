@@ -1,13 +1,21 @@
+import inspect
 import unittest
+from unittest.mock import patch
+import weakref
 
 import torch
+import torch.fx as fx
 import torch.nn as nn
 
 from kurisunet.config.types import FinalLayer
 from kurisunet.constants import ALL_FROM, DROP_FROM
+from kurisunet.net.batch import get_value_key, vmap
+from kurisunet.net.build import DEVICE_CONTEXT, TorchFunctionMode, build_options
 from kurisunet.net.module import OutputModule, PipelineModule
 from kurisuinfo import CustomizedModuleName
 
+INIT_GENERATOR = "generator" in inspect.signature(nn.init.uniform_).parameters
+
 
 class TestOutputModule(unittest.TestCase):
     def test_output_module(self):
@@ -473,6 +481,351 @@ class TestPipelineModule(unittest.TestCase):
         input = torch.randn(1, 3, 224, 224)
         self.assertEqual(module(input).shape, (1, 16, 224, 224))
 
+    def test_forward_release(self):
+        refs = []
+        record = lambda *a, **k: lambda x: refs.append(weakref.ref(x)) or x * 2
+        alive = lambda *a, **k: lambda *x: [r() is not None for r in refs]
+        layers: tuple[FinalLayer, ...] = (
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": record},
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": record},
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": record},
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM), (-2, ALL_FROM)),
+                "kwargs": {},
+                "module": alive,
+            },
+        )
+        module = PipelineModule()
+        module.init("Release", layers)
+        input = torch.randn(1, 3)
+        self.assertEqual(module(input), [True, False, True])
+
+    @unittest.skipIf(
+        TorchFunctionMode is None or not INIT_GENERATOR,
+        "seeded build requires nn.init with generator param",
+    )
+    def test_build_options(self):
+        def nested(*args, **kwargs):
+            module = PipelineModule()
+            module.init("Nested", layers[:2])
+            return module
+
+        layers: tuple[FinalLayer, ...] = (
+            {
+                "args": (3, 16, 3),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": nn.Conv2d,
+            },
+            {
+                "args": (16, 16),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": nn.Linear,
+            },
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": nested},
+        )
+
+        def build(workers: int, seed: int) -> dict[str, torch.Tensor]:
+            with build_options(workers, seed):
+                module = PipelineModule()
+                module.init("Build", layers)
+            return module.state_dict()
+
+        serial, parallel = build(0, 0), build(4, 0)
+        self.assertEqual(list(serial.keys()), list(parallel.keys()))
+        for key, value in serial.items():
+            self.assertTrue(torch.equal(value, parallel[key]), key)
+        self.assertFalse(torch.equal(serial["1.weight"], serial["3.1.weight"]))
+        self.assertFalse(torch.equal(serial["1.weight"], build(0, 1)["1.weight"]))
+        with self.assertRaises(ValueError):
+            with build_options(workers=2):
+                pass
+        with self.assertRaises(ValueError):
+            with build_options(workers=-1, seed=0):
+                pass
+
+    @unittest.skipIf(TorchFunctionMode is None, "seeded build requires torch>=1.13")
+    def test_build_options_without_generator(self):
+        layers: tuple[FinalLayer, ...] = (
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": lambda: nn.init.uniform_(torch.empty(2)),
+            },
+        )
+        target = "kurisunet.net.build._accepts_generator"
+        with patch(target, return_value=False), build_options(seed=0):
+            with self.assertRaisesRegex(ValueError, "generator"):
+                PipelineModule().init("Build", layers)
+
+    def test_fuse_conv_bn(self):
+        def get_layers(*from_: tuple) -> tuple[FinalLayer, ...]:
+            return (
+                {
+                    "args": (3, 8, 3),
+                    "from": ((-1, ALL_FROM),),
+                    "kwargs": {"bias": False},
+                    "module": nn.Conv2d,
+                },
+                {
+                    "args": (8,),
+                    "from": from_[0],
+                    "kwargs": {},
+                    "module": nn.BatchNorm2d,
+                },
+                {
+                    "args": (),
+                    "from": from_[1],
+                    "kwargs": {},
+                    "module": lambda *a, **k: OutputModule,
+                },
+            )
+
+        input = torch.randn(2, 3, 8, 8)
+        module = PipelineModule()
+        module.init("ConvBN", get_layers(((-1, ALL_FROM),), ((-1, ALL_FROM),)))
+        module.train()(input)  # INFO: update running stats
+        with self.assertRaises(ValueError):
+            module.fuse_conv_bn()
+        module.eval()
+        output = module(input)
+        self.assertEqual(module.fuse_conv_bn(), 1)
+        self.assertEqual(list(module.state_dict().keys()), ["1.weight", "1.bias"])
+        self.assertTrue(torch.allclose(module(input), output, atol=1e-6))
+        self.assertEqual(module.fuse_conv_bn(), 0)
+
+        module = PipelineModule()
+        from_ = ((-1, ALL_FROM), (-2, ALL_FROM))
+        module.init("ConvBN", get_layers(((-1, ALL_FROM),), from_))
+        self.assertEqual(module.eval().fuse_conv_bn(), 0)
+
+    @unittest.skipIf(not DEVICE_CONTEXT, "prune requires torch>=2.0")
+    def test_init_prune(self):
+        linear = lambda *a, **k: nn.Linear(4, 4)
+        layers: tuple[FinalLayer, ...] = (
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": linear},
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": linear},
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": linear},
+            {"args": (), "from": DROP_FROM, "kwargs": {}, "module": linear},
+            {
+                "args": (),
+                "from": ((-3, ALL_FROM),),
+                "kwargs": {},
+                "module": nn.Identity,
+            },
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": lambda *a, **k: OutputModule,
+            },
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": linear},
+        )
+        full = PipelineModule()
+        full.init("Full", layers)
+        with build_options(prune=True):
+            module = PipelineModule()
+            module.init("Prune", layers)
+        self.assertEqual(
+            list(module.state_dict().keys()),
+            ["1.weight", "1.bias", "6.weight", "6.bias"],
+        )
+        self.assertEqual(len(module._PipelineModule__modules), 2)  # type: ignore
+        self.assertFalse(module.load_state_dict(full.state_dict(), strict=False)[0])
+        input = torch.randn(2, 4)
+        self.assertTrue(torch.equal(module(input), full(input)))
+
+    def test_profile(self):
+        conv_bn: tuple[FinalLayer, ...] = (
+            {
+                "args": (3, 16, 1),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": nn.Conv2d,
+            },
+            {
+                "args": (16,),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": nn.BatchNorm2d,
+            },
+        )
+        conv_bn_module = PipelineModule()
+        conv_bn_module.init("ConvBN", conv_bn)
+        net: tuple[FinalLayer, ...] = (
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": lambda *a, **k: conv_bn_module,
+            },
+            {"args": (), "from": ((-1, ALL_FROM),), "kwargs": {}, "module": nn.ReLU},
+        )
+        module = PipelineModule()
+        module.init("Net", net)
+        input = torch.randn(2, 3, 4, 4)
+        self.assertEqual(module.get_profile(), [])
+
+        module.profile()
+        output = module(input)
+        module(input)
+        rows = module.get_profile()
+        paths = ["Net.1", "Net.1.ConvBN.1", "Net.1.ConvBN.2", "Net.2"]
+        self.assertEqual([r["path"] for r in rows], paths)
+        self.assertEqual([r["calls"] for r in rows], [2, 2, 2, 2])
+        self.assertEqual(rows[0]["shape"], (2, 16, 4, 4))
+        self.assertEqual(rows[0]["output_bytes"], 2 * output.numel() * 4)
+        self.assertGreaterEqual(rows[0]["wall_ns"], rows[1]["wall_ns"])
+
+        module.profile(False)
+        self.assertEqual(module.get_profile(), [])
+        self.assertTrue(torch.equal(module(input), output))
+
+    def test_to_fx(self):
+        conv_bn: tuple[FinalLayer, ...] = (
+            {
+                "args": (3, 16, 1, 1, 0, 1, 1),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {"bias": False},
+                "module": nn.Conv2d,
+            },
+            {
+                "args": (16,),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": nn.BatchNorm2d,
+            },
+        )
+        conv_bn_module = PipelineModule()
+        conv_bn_module.init("ConvBN", conv_bn)
+        net: tuple[FinalLayer, ...] = (
+            {
+                "args": (),
+                "from": ((0, 0),),
+                "kwargs": {},
+                "module": lambda *a, **k: conv_bn_module,
+            },
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": lambda *a, **k: lambda x: x.chunk(2, 1),
+            },
+            {
+                "args": (),
+                "from": ((-1, 1), (0, 1)),
+                "kwargs": {},
+                "module": lambda *a, **k: lambda x, y: x + y,
+            },
+        )
+        module = PipelineModule()
+        module.init("Net", net)
+        module.eval()
+        graph_module = module.to_fx(num_inputs=2)
+        self.assertIsInstance(graph_module, fx.GraphModule)
+        self.assertEqual(graph_module.state_dict().keys(), module.state_dict().keys())
+        nodes = graph_module.graph.nodes
+        call_modules = [n.target for n in nodes if n.op == "call_module"]
+        self.assertEqual(call_modules, ["1.1", "1.2"])
+        input = (torch.randn(1, 3, 8, 8), torch.randn(1, 8, 8, 8))
+        self.assertTrue(torch.allclose(graph_module(*input), module(*input)))
+
+    @unittest.skipIf(vmap is None, "batch_branches requires torch>=2.0")
+    def test_batch_branches(self):
+        conv = lambda from_, **kwargs: {
+            "args": (4, 4, 3),
+            "from": from_,
+            "kwargs": {"padding": 1, **kwargs},
+            "module": nn.Conv2d,
+        }
+        layers: tuple[FinalLayer, ...] = (
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM),),
+                "kwargs": {},
+                "module": lambda *a, **k: lambda x: x.chunk(2, 1),
+            },
+            conv(((-1, 0),)),
+            conv(((-2, 1),)),
+            conv(((-3, 1),), padding=2, dilation=2),
+            conv(((-3, ALL_FROM),)),
+            {
+                "args": (),
+                "from": ((-1, ALL_FROM), (-2, ALL_FROM), (-3, ALL_FROM)),
+                "kwargs": {},
+                "module": lambda *a, **k: lambda *x: torch.cat(x, 1),
+            },
+        )
+        module = PipelineModule()
+        module.init("Branches", layers)
+        module.eval()
+        input = torch.randn(2, 8, 8, 8)
+        output = module(input)
+        keys = list(module.state_dict().keys())
+        self.assertEqual(module.batch_branches(), 1)
+        self.assertEqual(module.batch_branches(), 0)
+        self.assertEqual(list(module.state_dict().keys()), keys)
+        self.assertTrue(torch.allclose(module(input), output, atol=1e-6))
+        with torch.no_grad():
+            self.assertTrue(torch.allclose(module(input), output, atol=1e-6))
+        self.assertTrue(torch.allclose(module.train()(input), output, atol=1e-6))
+
+    @unittest.skipIf(vmap is None, "batch_branches requires torch>=2.0")
+    def test_batch_branches_inplace(self):
+        conv = lambda from_: {
+            "args": (4, 4, 3),
+            "from": from_,
+            "kwargs": {"padding": 1},
+            "module": nn.Conv2d,
+        }
+        for inplace, expected in ((True, 0), (False, 1)):
+            layers: tuple[FinalLayer, ...] = (
+                {
+                    "args": (),
+                    "from": ((-1, ALL_FROM),),
+                    "kwargs": {},
+                    "module": lambda *a, **k: lambda x: x.chunk(2, 1),
+                },
+                conv(((-1, 0),)),
+                {
+                    "args": (),
+                    "from": ((-2, 1),),
+                    "kwargs": {"inplace": inplace},
+                    "module": nn.ReLU,
+                },
+                conv(((-3, 1),)),
+                {
+                    "args": (),
+                    "from": ((-1, ALL_FROM), (-2, ALL_FROM), (-3, ALL_FROM)),
+                    "kwargs": {},
+                    "module": lambda *a, **k: lambda *x: torch.cat(x, 1),
+                },
+            )
+            module = PipelineModule()
+            module.init("Inplace", layers)
+            module.eval()
+            input = torch.randn(2, 8, 8, 8)
+            output = module(input.clone())
+            self.assertEqual(module.batch_branches(), expected)
+            self.assertTrue(torch.allclose(module(input.clone()), output, atol=1e-6))
+
+    def test_get_value_key(self):
+        funcs = []
+        for scale in (1, 2, 1):
+            env = {"scale": scale}
+            exec("func = lambda x: x * scale", env)
+            funcs.append(env["func"])
+        keys = [get_value_key(f) for f in funcs]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], keys[2])
+        env = {"scale": bytearray()}
+        exec("func = lambda x: x * scale", env)
+        with self.assertRaises(TypeError):
+            get_value_key(env["func"])
+
 
 if __name__ == "__main__":
     unittest.main()
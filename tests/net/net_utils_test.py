@@ -8,9 +8,14 @@ from kurisunet.constants import (
     MODULE_START_INDEX,
 )
 from kurisunet.net.utils import (
+    analyze_layers,
     auto_unpack,
+    compile_forward,
+    get_batch_position,
     get_drop_layer_indexes,
     get_except_indexes,
+    get_last_used_indexes,
+    get_layer_depths,
     get_same_indexes,
     get_unused_layer_indexes,
     layer_enum,
@@ -123,6 +128,75 @@ class TestGetUnusedLayerIndexes(unittest.TestCase):
         self.assertEqual(result, unused_indexes)
 
 
+class TestAnalyzeLayers(unittest.TestCase):
+    def test_analyze_layers(self):
+        i = [i + LAYER_START_INDEX - 1 for i in range(8)]
+        layers: list[FinalLayer] = [
+            {"from": ((i[0], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {"from": ((i[1], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {"from": DROP_FROM, "module": Module, "args": (), "kwargs": {}},
+            {"from": ((i[1], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {
+                "from": ((i[1], 0), (i[1], 1)),
+                "module": Module,
+                "args": (),
+                "kwargs": {},
+            },
+            {"from": ((i[2], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {
+                "from": ((i[4], ALL_FROM), (i[5], 0)),
+                "module": Module,
+                "args": (),
+                "kwargs": {},
+            },
+        ]
+        graph = analyze_layers(layers)
+        self.assertEqual(graph["drop_set"], {i[3]})
+        self.assertEqual(graph["unused_set"], {i[4]})
+        self.assertEqual(graph["dead_set"], {i[4]})
+        forward_index = {
+            i[1]: i[1],
+            i[2]: i[2],
+            i[4]: i[3],
+            i[5]: i[4],
+            i[6]: i[5],
+            i[7]: i[6],
+        }
+        self.assertEqual(graph["forward_index"], forward_index)
+        predecessors = {
+            i[1]: (i[0],),
+            i[2]: (i[1],),
+            i[3]: (i[1],),
+            i[4]: (i[1],),
+            i[5]: (i[2],),
+            i[6]: (i[4], i[5]),
+        }
+        self.assertEqual(graph["predecessors"], predecessors)
+        successors = {
+            i[0]: [i[1]],
+            i[1]: [i[2], i[4]],
+            i[2]: [i[5]],
+            i[4]: [i[6]],
+            i[5]: [i[6]],
+        }
+        self.assertEqual(graph["successors"], successors)
+        last_used = {i[0]: i[1], i[1]: i[4], i[2]: i[5], i[4]: i[6], i[5]: i[6]}
+        self.assertEqual(graph["last_used"], last_used)
+
+    def test_dead_set(self):
+        i = [i + LAYER_START_INDEX - 1 for i in range(6)]
+        layers: list[FinalLayer] = [
+            {"from": ((i[0], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {"from": ((i[1], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {"from": ((i[2], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {"from": ((i[1], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+            {"from": ((i[1], ALL_FROM),), "module": Module, "args": (), "kwargs": {}},
+        ]
+        graph = analyze_layers(layers)
+        self.assertEqual(graph["unused_set"], {i[3], i[4]})
+        self.assertEqual(graph["dead_set"], {i[2], i[3], i[4]})
+
+
 class TestLayerEnum(unittest.TestCase):
     def test_layer_enum(self):
         seq = [1, 2, 3]
@@ -224,5 +298,83 @@ class TestRegularizeLayerFrom(unittest.TestCase):
                 regularize_layer_from(layers)
 
 
+class TestGetLastUsedIndexes(unittest.TestCase):
+    def test_get_last_used_indexes(self):
+        i = [i + LAYER_START_INDEX - 1 for i in range(4)]
+        from_list = [
+            (i[1], ((i[0], ALL_FROM),)),
+            (i[2], ((i[1], ALL_FROM),)),
+            (i[3], ((i[1], ALL_FROM), (i[2], 0))),
+        ]
+        result = get_last_used_indexes(from_list)
+        expected = {i[0]: i[1], i[1]: i[3], i[2]: i[3]}
+        self.assertEqual(result, expected)
+        self.assertEqual(get_last_used_indexes([]), {})
+
+
+class TestGetLayerDepths(unittest.TestCase):
+    def test_get_layer_depths(self):
+        from_list = [
+            (1, ((0, ALL_FROM),)),
+            (2, ((1, 0),)),
+            (3, ((1, 1),)),
+            (4, ((0, ALL_FROM), (3, ALL_FROM))),
+        ]
+        self.assertEqual(get_layer_depths(from_list), {0: 0, 1: 1, 2: 2, 3: 2, 4: 3})
+
+
+class TestGetBatchPosition(unittest.TestCase):
+    def test_get_batch_position(self):
+        from_list = [
+            (1, ((0, ALL_FROM),)),
+            (2, ((1, ALL_FROM),)),
+            (3, ((2, ALL_FROM),)),
+            (4, ((0, ALL_FROM),)),
+            (5, ((4, ALL_FROM),)),
+            (6, ((4, ALL_FROM),)),
+        ]
+        # INFO: 2 is read by 3 before the inputs of 5 are ready
+        self.assertEqual(get_batch_position(from_list, [2, 5, 6], set()), (4, [5, 6]))
+        self.assertEqual(get_batch_position(from_list, [5, 6], set()), (4, [5, 6]))
+
+    def test_inplace(self):
+        from_list = [
+            (1, ((0, ALL_FROM),)),
+            (2, ((1, ALL_FROM),)),
+            (3, ((1, ALL_FROM),)),
+            (4, ((1, ALL_FROM),)),
+        ]
+        self.assertEqual(get_batch_position(from_list, [2, 4], set()), (1, [2, 4]))
+        self.assertEqual(get_batch_position(from_list, [2, 4], {3}), (1, [2]))
+
+
+class TestCompileForward(unittest.TestCase):
+    def test_compile_forward(self):
+        i = [i + LAYER_START_INDEX - 1 for i in range(4)]
+        from_list = [
+            (i[1], ((i[0], ALL_FROM),)),
+            (i[2], ((i[1], ALL_FROM),)),
+            (i[3], ((i[1], ALL_FROM), (i[2], 1))),
+        ]
+        modules = (lambda x: x + 1, lambda x: (x, x * 2), lambda x, y: x - y)
+        forward = compile_forward(from_list)
+        self.assertEqual(forward(modules, (1,)), -2)
+        self.assertEqual(forward(modules, (3,)), -4)
+
+    def test_compile_forward_multiple_input(self):
+        i = [i + LAYER_START_INDEX - 1 for i in range(3)]
+        from_list = [
+            (i[1], ((i[0], 1), (i[0], 0))),
+            (i[2], ((i[0], ALL_FROM), (i[1], ALL_FROM))),
+        ]
+        modules = (lambda x, y: x - y, lambda x, y: (*x, y))
+        forward = compile_forward(from_list)
+        self.assertEqual(forward(modules, (1, 3)), (1, 3, 2))
+
+    def test_compile_forward_empty(self):
+        forward = compile_forward([])
+        self.assertEqual(forward((), (1, 2)), (1, 2))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,43 @@
+import os
+import time
+import unittest
+
+from kurisunet.register import get_module, new_registry, register_config
+from kurisunet.register import uncached_converter
+
+
+@uncached_converter  # INFO: measure the conversion, not the converted config cache
+def identity_converter(config, *args, **kwargs):
+    return config
+
+
+def get_config(num_layers: int, chain: int) -> dict:
+    return {
+        "Bench": {
+            "args": ["dim"],
+            "vars": [{f"v{i}": f"[dim] * {i % 8}"} for i in range(num_layers)],
+            "layers": [[-1, "nn.Identity", ["dim"]] for _ in range(num_layers)],
+            "converters": [[identity_converter] for _ in range(chain)],
+        }
+    }
+
+
+def build_time(num_layers: int, chain: int, repeat: int = 5) -> float:
+    registry = new_registry("Bench")
+    register_config(get_config(num_layers, chain), registry)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        get_module("Bench", (4,), registry=registry)
+    return (time.perf_counter() - start) / repeat
+
+
+@unittest.skipUnless(os.environ.get("KURISUNET_BENCHMARK"), "KURISUNET_BENCHMARK unset")
+class TestConverterBenchmark(unittest.TestCase):
+    def test_converter_chain(self):
+        times = {n: build_time(1000, n) for n in (1, 4, 16, 64)}
+        print(f"\nconstruction time of 1000 layers vs converter chain length: {times}")
+        self.assertLess(times[64], times[1] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,28 @@
+from functools import partial
+import gc
+import inspect
 from pathlib import Path
+import tempfile
 import unittest
+from unittest.mock import patch
+import weakref
 
 from kurisuinfo import summary
 import torch
 import yaml
 
 from kurisunet import get_module
+from kurisunet.config.module import parse_layers
 
 from kurisunet.constants import BUFFERS_KEY, CONVERTERS_KEY, PARAMS_KEY
-from kurisunet.register import register_config, ModuleRegister
+from kurisunet.register import register_config, register_module, ModuleRegister
+from kurisunet.register import new_registry, uncached_converter, use_registry
+from kurisunet.net.build import DEVICE_CONTEXT, TorchFunctionMode, build_options
+from kurisunet.register.register import get_builtins_env
+from kurisunet.register.register_config import _is_shareable
+from kurisunet.utils.weights import materialize_module, save_state_dict
+
+INIT_GENERATOR = "generator" in inspect.signature(torch.nn.init.uniform_).parameters
 
 
 def invalid_converter(config, *args, **kwargs):
@@ -51,6 +65,70 @@ class TestRegisterConfig(unittest.TestCase):
         output = module(input)
         self.assertEqual(output[0].shape, input.shape)
 
+    @unittest.skipIf(not DEVICE_CONTEXT, "device context requires torch>=2.0")
+    def test_get_module_meta(self):
+        dir = Path(__file__).parent
+        cfg = {
+            "path": "../test_module/net.yaml",
+            "name": "VAE",
+            "kwargs": {
+                "img_size": (1, 28, 28),
+                "encoder_dims": [512, 256, 128],
+                "decoder_dims": [128, 256, 512],
+                "z_dim": 10,
+            },
+            "input_shape": (1, 1, 28, 28),
+        }
+        register_config(dir / cfg["path"])
+        module = get_module(cfg["name"], kwargs=cfg["kwargs"]).eval()
+        meta = get_module(cfg["name"], kwargs=cfg["kwargs"], device="meta").eval()
+        self.assertTrue(all(t.is_meta for t in meta.state_dict().values()))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "weights.safetensors"
+            save_state_dict(module.state_dict(), path)
+            materialize_module(meta, path)
+            kwargs = {**cfg["kwargs"], "encoder_dims": [512, 256]}
+            other = get_module(cfg["name"], kwargs=kwargs, device="meta")
+            with self.assertRaises(ValueError):
+                materialize_module(other, path)
+        input = torch.rand(*cfg["input_shape"])
+        torch.manual_seed(0)
+        output = module(input)[0]
+        torch.manual_seed(0)
+        self.assertTrue(torch.equal(output, meta(input)[0]))
+
+        meta = get_module(cfg["name"], kwargs=cfg["kwargs"], device="meta")
+        materialize_module(meta)
+        self.assertFalse(any(t.is_meta for t in meta.state_dict().values()))
+
+    @unittest.skipIf(not DEVICE_CONTEXT, "device context requires torch>=2.0")
+    def test_materialize_config_tensors(self):
+        config = {
+            "Test": {
+                "buffers": [{"scale": "torch.ones(2)"}],
+                "layers": [[-1, "nn.BatchNorm1d", [2]]],
+            }
+        }
+        registry = new_registry("Materialize")
+        register_config(config, registry)
+        module = get_module("Test", registry=registry)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "weights.safetensors"
+            state_dict = module.state_dict()
+            state_dict.pop("1.bias")
+            save_state_dict(state_dict, path)
+            meta = get_module("Test", registry=registry, device="meta")
+            materialize_module(meta, path, strict=False)
+            self.assertTrue(torch.equal(meta.scale, torch.ones(2)))
+            save_state_dict({"1.weight": torch.ones(3)}, path)
+            meta = get_module("Test", registry=registry, device="meta")
+            with self.assertRaises(ValueError):  # INFO: scale is not in the file
+                materialize_module(meta, path, strict=False)
+            save_state_dict({**state_dict, "1.weight": torch.ones(3)}, path)
+            meta = get_module("Test", registry=registry, device="meta")
+            with self.assertRaises(ValueError):  # INFO: 1.bias is initialized
+                materialize_module(meta, path, strict=False)
+
     def test_register_config(self):
         dir = Path(__file__).parent
         cfg = {
@@ -130,6 +208,252 @@ class TestRegisterConfig(unittest.TestCase):
         with self.assertRaises(ValueError):
             get_module(cfg["name"], kwargs=cfg["kwargs"], config=config)
 
+    def test_build_plan_cache(self):
+        dir = Path(__file__).parent
+        register_config(dir / "../test_module/module.yaml")
+        target = "kurisunet.register.register_config.parse_layers"
+        with patch(target, wraps=parse_layers) as mock:
+            module1 = get_module("LinearReLU", (3, 4))
+            module2 = get_module("LinearReLU", (3, 4))
+            self.assertEqual(mock.call_count, 1)
+            get_module("LinearReLU", (3, 5))
+            self.assertEqual(mock.call_count, 2)
+            get_module("LinearReLU", kwargs={"in_dim": 3, "out_dim": 4})
+            self.assertEqual(mock.call_count, 3)
+        self.assertEqual(str(module1), str(module2))
+        self.assertIsNot(module1.get_submodule("1"), module2.get_submodule("1"))
+        input = torch.rand(2, 3)
+        self.assertEqual(module2(input).shape, (2, 4))
+
+    def test_build_plan_cache_stateful(self):
+        config = {
+            "Stateful": {
+                "args": ["dim"],
+                "vars": [{"linear": "nn.Linear(dim, dim)"}],
+                "layers": [[-1, "linear"]],
+            }
+        }
+        register_config(config)
+        module1 = get_module("Stateful", (3,))
+        module2 = get_module("Stateful", (3,))
+        self.assertIsNot(module1.get_submodule("1"), module2.get_submodule("1"))
+
+    def test_build_plan_cache_release(self):
+        config = {
+            "Chunk": {
+                "args": ["c"],
+                "layers": [[-1, "lambda x: x.chunk(c, 1)"]],
+                "post_exec": "self.chunks = c",
+            }
+        }
+        register_config(config)
+        module = get_module("Chunk", (2,))
+        ref = weakref.ref(module)
+        del module
+        module = get_module("Chunk", (2,))  # INFO: built from the cached plan
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(module.chunks, 2)
+        self.assertEqual(len(module(torch.rand(2, 4))), 2)
+
+    def test_is_shareable(self):
+        linear = torch.nn.Linear(3, 3)
+        self.assertTrue(_is_shareable(lambda x: x + 1))
+        self.assertFalse(_is_shareable(lambda x: linear(x)))
+        self.assertFalse(_is_shareable(partial(torch.add, torch.ones(1))))
+        self.assertFalse(_is_shareable(linear.forward))
+        self.assertTrue(_is_shareable((torch.nn.Linear, len, {"a": [1, "b"]})))
+
+    def test_register_lazy_sections(self):
+        text = (
+            "Good:\n  layers:\n    - [-1, nn.ReLU]\n"
+            "---\n"
+            "Bad:\n  layers:\n    - [-1, \"nn.(\"]\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "net.yaml"
+            path.write_text(text)
+            register_config(path)
+        self.assertIsInstance(get_module("Good"), torch.nn.Module)
+        self.assertTrue(ModuleRegister.has("Bad"))
+        with self.assertRaisesRegex(ValueError, "Bad.layers.0.1"):
+            get_module("Bad")
+
+    def test_converter_modify(self):
+        def converter(config, dim):
+            config["layers"][0][2].append(dim)
+            return config
+
+        config = {
+            "Test": {
+                "args": ["dim"],
+                "layers": [[-1, "nn.Linear", [2]]],
+                "converters": [[converter, ["dim"]]],
+            }
+        }
+        registry = new_registry("Modify")
+        register_config(config, registry)
+        for dim in (3, 4):
+            module = get_module("Test", (dim,), registry=registry)
+            self.assertEqual(module.get_submodule("1").out_features, dim)
+
+    def test_converter_cache(self):
+        calls = []
+
+        def converter(config, dim):
+            calls.append(dim)
+            return {**config, "layers": [[-1, "nn.Linear", [dim, dim]]]}
+
+        config = lambda c: {
+            "Test": {"args": ["dim"], "layers": [], "converters": [[c, ["dim"]]]}
+        }
+        registry = new_registry("Cache")
+        register_config(config(converter), registry)
+        module1 = get_module("Test", (3,), registry=registry)
+        module2 = get_module("Test", kwargs={"dim": 3}, registry=registry)
+        get_module("Test", (4,), registry=registry)
+        self.assertEqual(calls, [3, 4])
+        self.assertIsNot(module1.get_submodule("1"), module2.get_submodule("1"))
+        info = registry.get_module("Test").get_converter_cache_info()
+        self.assertEqual((info["hits"], info["misses"], info["currsize"]), (1, 2, 2))
+        register_config({"Other": {"layers": [[-1, "nn.ReLU"]]}}, registry)
+        get_module("Test", (3,), registry=registry)  # INFO: cleared by the change
+        self.assertEqual(calls, [3, 4, 3])
+
+        calls.clear()
+        registry = new_registry("Uncached")
+        register_config(config(uncached_converter(converter)), registry)
+        get_module("Test", (3,), registry=registry)
+        get_module("Test", (3,), registry=registry)
+        self.assertEqual(calls, [3, 3])
+
+    def test_unused_vars(self):
+        config = {
+            "Test": {
+                "vars": [{"dim": 3}, {"unused": "undefined"}, {"out": "dim + 1"}],
+                "layers": [[-1, "nn.Linear", ["dim", "out"]]],
+            }
+        }
+        registry = new_registry("Vars")
+        register_config(config, registry)
+        module = get_module("Test", registry=registry)
+        self.assertEqual(module.get_submodule("1").out_features, 4)
+
+    @unittest.skipIf(
+        TorchFunctionMode is None or not INIT_GENERATOR,
+        "seeded build requires nn.init with generator param",
+    )
+    def test_parallel_build(self):
+        config = {
+            "Block": {"args": ["dim"], "layers": [[-1, "nn.Linear", ["dim", "dim"]]]},
+            "Test": {"layers": [[-1, "Block", [i % 3 + 1]] for i in range(8)]},
+        }
+        registry = new_registry("Parallel")
+        register_config(config, registry)
+        with build_options(workers=4, seed=0):
+            module = get_module("Test", registry=registry)
+        self.assertEqual(module.get_submodule("8.1").out_features, 2)
+
+    def test_registered_over_global(self):
+        config = {
+            "global_vars": [{"Block": "None"}, {"dim": 3}],
+            "Block": {"layers": [[-1, "nn.Linear", ["dim", "dim"]]]},
+            "Test": {"layers": [[-1, "Block"]]},
+        }
+        registry = new_registry("Order")
+        register_config(config, registry)
+        module = get_module("Test", registry=registry)
+        self.assertEqual(module.get_submodule("1.1").out_features, 3)
+
+    def test_constant_folding(self):
+        class Record(torch.nn.Module):
+            def __init__(self, func):
+                super().__init__()
+                self.func = func
+
+        config = {
+            "Test": {
+                "args": ["dim"],
+                "layers": [
+                    [-1, "Record", ["lambda x: x + 1"]],
+                    [-1, "Record", ["lambda x: x + dim"]],
+                ],
+            }
+        }
+        registry = new_registry("Consts")
+        registry.register_module("Record", Record)
+        register_config(config, registry)
+        module1 = get_module("Test", (1,), registry=registry)
+        module2 = get_module("Test", (2,), registry=registry)
+        self.assertIs(module1.get_submodule("1").func, module2.get_submodule("1").func)
+        self.assertIsNot(module1.get_submodule("2").func, module2.get_submodule("2").func)
+        self.assertEqual(module1.get_submodule("2").func(1), 2)
+
+    def test_builtins_env(self):
+        env = get_builtins_env()
+        self.assertIs(get_builtins_env(), env)
+        self.assertIs(env["len"], len)
+
+        @register_module
+        def TestModule():
+            pass
+
+        self.assertNotIn("TestModule", env)
+        self.assertIs(get_builtins_env()["TestModule"], TestModule)
+        ModuleRegister.get_env()["TestModule"] = None
+        self.assertIs(get_builtins_env()["TestModule"], TestModule)
+
+        config = {
+            "Test": {
+                "layers": [[-1, "nn.Identity"]],
+                "post_exec": "assert callable(self)",
+            }
+        }
+        register_config(config)
+        self.assertIsInstance(get_module("Test"), torch.nn.Module)
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        ModuleRegister.clear()
+
+    def test_scoped_configs(self):
+        config = lambda dim: {"Block": {"layers": [[-1, f"nn.Linear({dim}, {dim})"]]}}
+        registry1, registry2 = new_registry("A"), new_registry("B")
+        register_config(config(2), registry1)
+        register_config(config(3), registry2)
+        self.assertFalse(ModuleRegister.has("Block"))
+        module1 = get_module("Block", registry=registry1)
+        module2 = get_module("Block", registry=registry2)
+        self.assertEqual(module1(torch.rand(1, 2)).shape, (1, 2))
+        self.assertEqual(module2(torch.rand(1, 3)).shape, (1, 3))
+        with use_registry(registry1):
+            self.assertTrue(ModuleRegister.has("Block"))
+            self.assertTrue(ModuleRegister.has("Output"))
+        with self.assertRaises(ValueError):
+            register_config(config(2), registry1)
+
+    def test_child_and_snapshot(self):
+        @register_module
+        def Parent():
+            pass
+
+        snapshot = new_registry("Base")
+        snapshot.register_module("Parent", Parent)
+        snapshot = snapshot.snapshot()
+        child1, child2 = snapshot.child("Child1"), snapshot.child("Child2")
+        child1.register_module("Parent", len)
+        self.assertIs(child1.get_module("Parent"), len)
+        self.assertIs(child2.get_module("Parent"), Parent)
+        self.assertIs(child2.get_env()["Output"], snapshot.get_env()["Output"])
+        with self.assertRaises(ValueError):
+            snapshot.register_module("Other", len)
+        env = child2.get_builtins_env()
+        self.assertIs(child2.get_builtins_env(), env)
+        child2.register_module("Other", len)
+        self.assertNotIn("Other", env)
+        self.assertIn("Other", child2.get_builtins_env())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,48 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT = """
+import resource, sys
+import torch.nn as nn
+from kurisunet.utils.weights import load_state_dict, load_weights_into, save_state_dict
+
+mode, path = sys.argv[1], sys.argv[2]
+module = nn.Sequential(*[nn.Linear(2048, 2048) for _ in range(16)])
+if mode == "save":
+    save_state_dict(module.state_dict(), path)
+    sys.exit()
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if mode == "load_state_dict":
+    module.load_state_dict(load_state_dict(path))
+else:
+    load_weights_into(module, path, assign=mode == "assign")
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base)
+"""
+
+
+def peak_rss(mode: str, path: Path) -> int:
+    """Peak RSS increase of loading weights in KB, measured in a new process."""
+    cmd = [sys.executable, "-c", SCRIPT, mode, str(path)]
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return int(output.strip() or 0)
+
+
+@unittest.skipUnless(os.environ.get("KURISUNET_BENCHMARK"), "KURISUNET_BENCHMARK unset")
+class TestWeightsBenchmark(unittest.TestCase):
+    def test_load_weights_into(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "weights.safetensors"
+            peak_rss("save", path)
+            modes = ("load_state_dict", "copy", "assign")
+            peaks = {m: peak_rss(m, path) // 1024 for m in modes}
+        print(f"\npeak RSS increase (MB) of 256MB weights: {peaks}")
+        self.assertLess(peaks["copy"], peaks["load_state_dict"] / 2)
+        self.assertLess(peaks["assign"], peaks["load_state_dict"] / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
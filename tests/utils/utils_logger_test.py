@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from loguru import logger as base_logger
+
+from kurisunet.constants import LOG_LEVEL_ENV
+from kurisunet.utils.logger import (
+    disable_logger,
+    get_logger,
+    is_enabled,
+    log_lazy,
+    set_logger,
+)
+
+
+class TestLogger(unittest.TestCase):
+    def tearDown(self):
+        set_logger(level="INFO")
+
+    def test_is_enabled(self):
+        set_logger(level="INFO")
+        self.assertTrue(is_enabled("Module", "INFO"))
+        self.assertFalse(is_enabled("Module", "DEBUG"))
+        self.assertFalse(is_enabled("SubModules", "CRITICAL"))
+        set_logger(level="DEBUG", names=("SubModules",))
+        self.assertTrue(is_enabled("SubModules", "DEBUG"))
+        self.assertFalse(is_enabled("Module", "ERROR"))
+
+    def test_log_lazy(self):
+        calls = []
+        message = lambda: calls.append(1) or "message"
+        set_logger(level="INFO")
+        log_lazy("Layers", "DEBUG", message)
+        log_lazy("Module", "DEBUG", message)
+        self.assertEqual(calls, [])
+        log_lazy("Module", "INFO", message)
+        self.assertEqual(calls, [1])
+
+    def test_get_logger(self):
+        self.assertIs(get_logger("Module"), get_logger("Module"))
+        messages = []
+        set_logger(level="INFO")
+        sink = base_logger.add(messages.append, format="{extra[name]} {message}")
+        try:
+            get_logger("Module").info("shown {}", 1)
+            get_logger("Module").debug("hidden")
+            disable_logger()
+            self.assertFalse(is_enabled("KurisuNet", "CRITICAL"))
+            get_logger("Module").critical("hidden")
+        finally:
+            base_logger.remove(sink)
+        self.assertEqual([str(m).strip() for m in messages], ["Module shown 1"])
+
+    def test_loguru_methods(self):
+        messages = []
+        set_logger(level="INFO")
+        sink = base_logger.add(messages.append, format="{extra[name]} {message}")
+        try:
+            get_logger("Module").success("success")
+            get_logger("Module").bind(key=1).info("bound")
+            get_logger("Module").opt(lazy=True).info("lazy {}", lambda: 1)
+        finally:
+            base_logger.remove(sink)
+        expected = ["Module success", "Module bound", "Module lazy 1"]
+        self.assertEqual([str(m).strip() for m in messages], expected)
+
+    def test_import_without_side_effect(self):
+        code = (
+            "from loguru import logger; ids = set(logger._core.handlers); "
+            "import kurisunet; assert set(logger._core.handlers) == ids"
+        )
+        env = {k: v for k, v in os.environ.items() if k != LOG_LEVEL_ENV}
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)  # INFO: same imports as tests
+        subprocess.run([sys.executable, "-c", code], check=True, env=env)
+
+
+if __name__ == "__main__":
+    unittest.main()
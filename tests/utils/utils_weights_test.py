@@ -0,0 +1,163 @@
+from pathlib import Path
+import tempfile
+import unittest
+
+import torch
+import torch.nn as nn
+
+from kurisunet.net.build import DEVICE_CONTEXT
+from kurisunet.utils.weights import (
+    _fuzzy_match,
+    convert_state_dict,
+    convert_weights_file,
+    get_key_map,
+    load_sharded_state_dict,
+    load_weights_into,
+    open_weights,
+    save_sharded_state_dict,
+    save_state_dict,
+)
+
+
+def get_net() -> nn.Module:
+    return nn.Sequential(nn.Linear(4, 8), nn.BatchNorm1d(8), nn.Linear(8, 2))
+
+
+def assert_state_dict_equal(test: unittest.TestCase, a: nn.Module, b: nn.Module):
+    a_state_dict, b_state_dict = a.state_dict(), b.state_dict()
+    test.assertEqual(list(a_state_dict.keys()), list(b_state_dict.keys()))
+    for key, value in a_state_dict.items():
+        test.assertTrue(torch.equal(value, b_state_dict[key]), key)
+
+
+class TestLoadWeightsInto(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.net = get_net()
+        self.net[1].running_mean.add_(1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_safetensors(self):
+        path = self.dir / "net.safetensors"
+        save_state_dict(self.net.state_dict(), path)
+        for assign in (False, True):
+            module = load_weights_into(get_net(), path, assign=assign)
+            assert_state_dict_equal(self, self.net, module)
+            self.assertIsInstance(module[0].weight, nn.Parameter)
+
+    @unittest.skipIf(not DEVICE_CONTEXT, "device context requires torch>=2.0")
+    def test_meta(self):
+        path = self.dir / "net.safetensors"
+        save_state_dict(self.net.state_dict(), path)
+        with torch.device("meta"):
+            module = get_net()
+        load_weights_into(module, path, assign=True)
+        assert_state_dict_equal(self, self.net, module)
+
+    def test_views(self):
+        path = self.dir / "net.safetensors"
+        save_state_dict(self.net.state_dict(), path)
+        module = get_net()
+        storage = torch.zeros(8 * 4 * 2 + 8)
+        module[0].weight = nn.Parameter(storage[1:65:2].view(8, 4))  # INFO: strided
+        module[0].bias = nn.Parameter(storage[-8:])  # INFO: shared storage with offset
+        load_weights_into(module, path)
+        assert_state_dict_equal(self, self.net, module)
+
+    def test_strategy(self):
+        path = self.dir / "net.pt"
+        state_dict = self.net.state_dict()
+        torch.save({f"old.{k}": v for k, v in state_dict.items()}, path)
+        with self.assertRaises(ValueError):
+            load_weights_into(get_net(), path)
+        module = load_weights_into(get_net(), path, strategy="register_order")
+        assert_state_dict_equal(self, self.net, module)
+
+    def test_mismatch(self):
+        path = self.dir / "net.safetensors"
+        save_state_dict(self.net.state_dict(), path)
+        with self.assertRaises(ValueError):
+            load_weights_into(nn.Sequential(nn.Linear(4, 8)), path)
+        load_weights_into(nn.Sequential(nn.Linear(4, 8)), path, strict=False)
+        with self.assertRaises(ValueError):
+            load_weights_into(nn.Sequential(nn.Linear(4, 9)), path, strict=False)
+
+
+class TestGetKeyMap(unittest.TestCase):
+    def test_register_order(self):
+        old = {"a": torch.zeros(1), "b": torch.zeros(2)}
+        new = {"x": torch.zeros(1), "y": torch.zeros(2)}
+        self.assertEqual(get_key_map(old, new), {"a": "x", "b": "y"})
+        with self.assertRaises(ValueError):
+            get_key_map(old, {"x": torch.zeros(1)})
+        with self.assertRaises(ValueError):
+            get_key_map(old, new, "unknown")  # type: ignore
+
+    def test_shape(self):
+        old = {"a": torch.zeros(1), "b": torch.zeros(2), "c": torch.zeros(1)}
+        new = {"x": torch.zeros(2), "y": torch.zeros(1, dtype=torch.int64)}
+        new["z"] = torch.zeros(1)
+        self.assertEqual(get_key_map(old, new, "shape"), {"a": "z", "b": "x"})
+
+    def test_fuzzy(self):
+        net = get_net()
+        old = {f"model.{k.replace('.', '_')}": v for k, v in net.state_dict().items()}
+        key_map = get_key_map(old, net.state_dict(), "fuzzy")
+        self.assertEqual(list(key_map.values()), list(net.state_dict().keys()))
+        del old["model.1_weight"]
+        key_map = get_key_map(old, net.state_dict(), "fuzzy")
+        self.assertEqual(key_map["model.1_bias"], "1.bias")
+        self.assertNotIn("1.weight", key_map.values())
+        converted = convert_state_dict(old, net.state_dict(), "fuzzy")
+        self.assertEqual(len(converted), len(old))
+
+    def test_fuzzy_far(self):
+        old = [f"old.{i}.weight" for i in range(300)]
+        new = [f"new.{i}.weight" for i in reversed(range(300))]
+        key_map = _fuzzy_match(old, new)
+        expected = {f"old.{i}.weight": f"new.{i}.weight" for i in range(300)}
+        self.assertEqual(key_map, expected)
+
+
+class TestConvertWeightsFile(unittest.TestCase):
+    def test_convert_weights_file(self):
+        net = nn.Sequential(*[nn.Linear(2, 2) for _ in range(11)])
+        linears = [nn.Linear(2, 2, device="meta") for _ in range(11)]
+        new = nn.Sequential(nn.Identity(), *linears)
+        with tempfile.TemporaryDirectory() as tmp:
+            old_path, new_path = Path(tmp) / "old.pt", Path(tmp) / "new.safetensors"
+            torch.save(net.state_dict(), old_path)
+            convert_weights_file(old_path, new_path, new.state_dict())
+            with open_weights(new_path) as (specs, _):
+                self.assertEqual(set(specs.keys()), set(new.state_dict().keys()))
+                indexes = [int(k.split(".")[0]) for k in specs]
+                self.assertEqual(indexes, sorted(indexes))
+            load_weights_into(new, new_path, assign=True)
+        for a, b in zip(net.state_dict().values(), new.state_dict().values()):
+            self.assertTrue(torch.equal(a, b))
+
+
+class TestShardedStateDict(unittest.TestCase):
+    def test_sharded_state_dict(self):
+        net = get_net()
+        state_dict = net.state_dict()
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = save_sharded_state_dict(state_dict, tmp, max_shard_size=64)
+            self.assertGreater(len(list(Path(tmp).glob("*.safetensors"))), 2)
+            loaded = load_sharded_state_dict(index_path)
+            self.assertEqual(list(loaded.keys()), list(state_dict.keys()))
+            for key, value in state_dict.items():
+                self.assertTrue(torch.equal(value, loaded[key]), key)
+
+            loaded = load_sharded_state_dict(index_path, prefix="1")
+            module = nn.BatchNorm1d(8)
+            module.load_state_dict(loaded)
+            self.assertTrue(torch.equal(module.weight, net[1].weight))
+            self.assertEqual(load_sharded_state_dict(index_path, prefix="3"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()